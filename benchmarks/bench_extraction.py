@@ -0,0 +1,103 @@
+"""
+Порівняння пошуку карток: повний HTML + BeautifulSoup проти page.evaluate у браузері.
+
+Кожен режим запускається в окремому процесі, щоб пікова RSS (ru_maxrss) не змішувалась.
+    python -m benchmarks.bench_extraction                       # синтетична сторінка на 500 карток
+    python -m benchmarks.bench_extraction --html saved_page.html --cards 0
+"""
+import argparse
+import asyncio
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+CARD_TEMPLATE = (
+    '<div class="card"><div><img src="https://scontent.example/avatar_{i}.jpg">'
+    '<span>Ідентифікатор бібліотеки: {ad_id}</span>'
+    '<span>Початок показу: {day} трав 2025 р.</span>'
+    '<div><div><div><p>{filler}</p></div></div></div>'
+    '<img src="https://scontent.example/creative_{i}.jpg"><hr>'
+    '<p>Цей креатив і текст використовуються в {similar} оголошеннях</p></div></div>'
+)
+
+
+def synthetic_page(cards: int, first_id: int = 10 ** 15) -> str:
+    body = ''.join(
+        CARD_TEMPLATE.format(i=first_id + i, ad_id=first_id + i, day=i % 28 + 1, similar=i % 7 + 2,
+                             filler='Текст оголошення ' * 40)
+        for i in range(cards)
+    )
+    return f'<html><head><meta charset="utf-8"></head><body><div id="feed">{body}</div></body></html>'
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss у Linux — кілобайти
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_mode(mode: str, page_path: Path) -> dict:
+    from playwright.async_api import async_playwright
+    from facebook.scraper import extract_ads_from_html, extract_ads_in_page
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page()
+        await page.goto(page_path.as_uri())
+        rss_before = peak_rss_mb()
+
+        started = time.perf_counter()
+        if mode == 'html':
+            records = extract_ads_from_html(await page.content())
+        else:
+            records = await extract_ads_in_page(page)
+        elapsed = time.perf_counter() - started
+
+        await browser.close()
+    return {
+        'mode': mode,
+        'ads': len(records),
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--html', type=Path, help='збережена сторінка бібліотеки реклами')
+    parser.add_argument('--cards', type=int, default=500, help='кількість карток синтетичної сторінки')
+    parser.add_argument('--mode', choices=('html', 'dom'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(asyncio.run(run_mode(args.mode, args.html))))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        page_path = args.html
+        if page_path is None:
+            page_path = Path(tmp) / 'synthetic.html'
+            page_path.write_text(synthetic_page(args.cards), encoding='utf-8')
+
+        results = []
+        for mode in ('html', 'dom'):
+            output = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_extraction', '--mode', mode, '--html', str(page_path.resolve())],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    html, dom = results
+    if html['ads'] != dom['ads']:
+        print(f"⚠️ Режими знайшли різну кількість оголошень: html={html['ads']}, dom={dom['ads']}")
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    print(f"Прискорення: x{html['seconds'] / max(dom['seconds'], 1e-6):.1f}, "
+          f"пікова RSS: {html['peak_rss_mb']} МБ -> {dom['peak_rss_mb']} МБ")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,23 @@
 import logging
+from contextlib import aclosing
 
 logger = logging.getLogger(__name__)
-from collections import defaultdict
-from datetime import date, timedelta
-
-import imagehash
 from aiogram import types, Router, F
 from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, FSInputFile, InputMediaPhoto
-from sqlalchemy.orm import joinedload
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from sqlalchemy import select
 
-import shared_state
-from database.models import Session, Business, AdCreative
-from facebook.scraper import scrape_all
+from database.models import AsyncSession, Business
+from config import REPORT_PAGE_SIZE
+from metrics import SCRAPE_CONTENTION
+from scheduler.jobs import start_run, set_run_message, run_progress, queue_overview
 from bot.keyboards import get_main_menu_keyboard
+from bot.progress import start_tracking, format_progress
+from bot.report_cache import report_cache
+from bot.reports import (load_unique_report, stream_full_report_page, period_filters, cursor_of,
+                         pack_page_callback, unpack_page_callback, PAGE_CALLBACK_PREFIX)
+from bot.sender import send_scheduler
 from bot.states import ReportState, ReportAllState
 
 router = Router()
@@ -44,10 +47,10 @@ async def add_business_command(message: types.Message, command: CommandObject):
 
     fb_page_id, business_name = args
 
-    session = Session()
+    session = AsyncSession()
     try:
         # тест чи є такий бізнес
-        existing_business = session.query(Business).filter_by(fb_page_id=fb_page_id).first()
+        existing_business = await session.scalar(select(Business).filter_by(fb_page_id=fb_page_id))
         if existing_business:
             await message.answer(f"⚠️ Бізнес '{existing_business.name}' з ID `{fb_page_id}` вже існує в базі.")
             return
@@ -55,17 +58,17 @@ async def add_business_command(message: types.Message, command: CommandObject):
         # коміт бізнесу
         new_business = Business(name=business_name, fb_page_id=fb_page_id)
         session.add(new_business)
-        session.commit()
+        await session.commit()
 
         await message.answer(f"✅ Бізнес '{business_name}' з ID `{fb_page_id}` успішно додано до моніторингу!")
         logger.info(f"Додано новий бізнес: {business_name} ({fb_page_id})")
 
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         await message.answer(f"❌ Сталася помилка при додаванні в базу даних: {e}")
         logger.error(f"Помилка додавання бізнесу: {e}")
     finally:
-        session.close()
+        await session.close()
 
 
 @router.message(Command("delete_business"))
@@ -79,23 +82,23 @@ async def delete_business_command(message: types.Message, command: CommandObject
         return
 
     business_id = int(command.args.strip())
-    session = Session()
+    session = AsyncSession()
     try:
-        business = session.query(Business).filter_by(fb_page_id=str(business_id)).first()
+        business = await session.scalar(select(Business).filter_by(fb_page_id=str(business_id)))
         if not business:
             await message.answer(f"⚠️ Бізнес з ID `{business_id}` не знайдено.")
             return
 
-        session.delete(business)
-        session.commit()
+        await session.delete(business)
+        await session.commit()
         await message.answer(f"✅ Бізнес '{business.name}' (ID: {business_id}) успішно видалено.")
         logger.info(f"Видалено бізнес: {business.name} (ID: {business_id})")
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         await message.answer(f"❌ Помилка при видаленні бізнесу: {e}")
         logger.error(f"Помилка видалення бізнесу: {e}")
     finally:
-        session.close()
+        await session.close()
 
 @router.message(Command('start'))
 async def start_handler(msg: types.Message):
@@ -111,11 +114,30 @@ async def start_handler(msg: types.Message):
 
 @router.message(Command('businesses'))
 async def list_businesses(msg: types.Message):
-    session = Session()
-    businesses = session.query(Business).all()
+    async with AsyncSession() as session:
+        businesses = (await session.execute(select(Business))).scalars().all()
     text = '\n'.join([f"{b.id}. {b.name}" for b in businesses])
     await msg.answer(f"📊 Моніторяться такі бізнеси:\n{text}")
-    session.close()
+
+@router.message(Command('send_stats'))
+async def send_stats_command(msg: types.Message):
+    """Стан черги надсилання: глибина, затримка від постановки до відправки, RetryAfter."""
+    stats = send_scheduler.stats()
+    await msg.answer(
+        f"📨 У черзі: {stats['queue_depth']} (чатів: {stats['active_chats']})\n"
+        f"Надіслано: {stats['sent_messages']}, помилок: {stats['failed']}, RetryAfter: {stats['retry_after_waits']}\n"
+        f"Затримка p50/p95: {stats['latency_p50']} / {stats['latency_p95']} с"
+    )
+
+@router.message(Command('cache_stats'))
+async def cache_stats_command(msg: types.Message):
+    """Статистика кешу звітів."""
+    stats = report_cache.stats()
+    await msg.answer(
+        f"🗃️ Кеш звітів: {stats['entries']} записів, покоління даних {stats['generation']}\n"
+        f"Влучань: {stats['hits']}, промахів: {stats['misses']} (hit rate {stats['hit_rate']:.0%}), "
+        f"витіснено: {stats['evictions']}"
+    )
 
 # --- ТРЕБА ФІКСАНУТИ ---
 # @router.message(F.text.in_({"⏳ Довготривалі креативи", "/long"}))
@@ -187,16 +209,17 @@ async def report_start(message: types.Message, state: FSMContext):
     await state.set_state(ReportState.waiting_for_period)
 
 
-@router.callback_query(ReportState.waiting_for_period)
+# Кроки діалогів фільтруються і за станом, і за префіксом callback_data, щоб старі кнопки
+# (наприклад, "наступна сторінка" повного звіту) не потрапляли в обробник поточного кроку
+@router.callback_query(ReportState.waiting_for_period, F.data.startswith("report_period_"))
 async def period_chosen(call: types.CallbackQuery, state: FSMContext):
     """Обробляє вибір періоду, зберігає його і питає про бізнес."""
     await call.answer()
     period = call.data.split('_')[-1]
     await state.update_data(period=period)
 
-    session = Session()
-    businesses = session.query(Business).all()
-    session.close()
+    async with AsyncSession() as session:
+        businesses = (await session.execute(select(Business))).scalars().all()
 
     buttons = [[InlineKeyboardButton(text=b.name, callback_data=f"report_biz_{b.id}")] for b in businesses]
     buttons.append([InlineKeyboardButton(text="📈 Всі бізнеси", callback_data="report_biz_all")])
@@ -207,7 +230,7 @@ async def period_chosen(call: types.CallbackQuery, state: FSMContext):
     await state.set_state(ReportState.waiting_for_business)
 
 
-@router.callback_query(ReportState.waiting_for_business)
+@router.callback_query(ReportState.waiting_for_business, F.data.startswith("report_biz_"))
 async def business_chosen(call: types.CallbackQuery, state: FSMContext):
     """
     Фінальний крок. Формує звіт, розраховуючи кількість
@@ -220,79 +243,21 @@ async def business_chosen(call: types.CallbackQuery, state: FSMContext):
     period = user_data['period']
     business_id_str = call.data.split('_')[-1]
 
-    # --- 1. Отримуємо кандидатів з БД ---
-    session = Session()
-    query = session.query(AdCreative).options(joinedload(AdCreative.business))
-
-    if period != 'all':
-        query = query.filter(AdCreative.is_active == True)
-
-    today = date.today()
-    if period == 'today':
-        query = query.filter(AdCreative.start_date == today)
-        period_str = f"за {today.strftime('%d.%m.%Y')}"
-    elif period == 'week':
-        start_date = today - timedelta(days=7)
-        query = query.filter(AdCreative.start_date >= start_date)
-        period_str = f"з {start_date.strftime('%d.%m')} по {today.strftime('%d.%m')}"
-    elif period == 'month':
-        start_date = today - timedelta(days=30)
-        query = query.filter(AdCreative.start_date >= start_date)
-        period_str = f"за останні 30 днів"
-    else:
-        period_str = "за весь час"
-
-    business_name = "Всі бізнеси"
-    if business_id_str != 'all':
-        business_id = int(business_id_str)
-        query = query.filter(AdCreative.business_id == business_id)
-        business = session.query(Business).filter_by(id=business_id).first()
-        if business:
-            business_name = business.name
-
-    ads = query.order_by(AdCreative.start_date.desc()).all()
-    session.close()
+    # --- 1-2. Групи креативів (з кешу, якщо з останнього скрапінгу такий звіт уже будувався) ---
+    report = await load_unique_report(period, business_id_str)
+    business_name, period_str, groups = report['business_name'], report['period_str'], report['groups']
 
-    if not ads:
+    if not groups:
         await call.message.edit_text("🤷‍♂️ За обраними критеріями нічого не знайдено.")
         await state.clear()
         return
 
-    # --- 2. ДИНАМІЧНЕ ГРУПУВАННЯ ЗА ХЕШЕМ ---
-    HAMMING_DISTANCE_THRESHOLD = 14
-    hash_groups = []
-
-    for ad in ads:
-        if not ad.image_hash or not ad.local_path:
-            continue
-
-        try:
-            current_hash = imagehash.hex_to_hash(ad.image_hash)
-            found_group = False
-            for group in hash_groups:
-                representative_hash = imagehash.hex_to_hash(group[0].image_hash)
-                if current_hash - representative_hash <= HAMMING_DISTANCE_THRESHOLD:
-                    group.append(ad)
-                    found_group = True
-                    break
-            if not found_group:
-                hash_groups.append([ad])
-        except Exception as e:
-            logger.error(f"Помилка обробки хешу для ad_id {ad.id}: {e}")
-
-    if not hash_groups:
-        await call.message.edit_text("🤷‍♂️ Не вдалося знайти креативи з зображеннями для аналізу.")
-        await state.clear()
-        return
-
     # --- 3. Категоризуємо групи за їхнім розміром ---
     top_performers = []  # 5+ копій
     mid_performers = []  # 2-4 копії
     single_creatives = []  # 1 копія
 
-    for group in hash_groups:
-        group_size = len(group)
-        representative_ad = group[0]
+    for representative_ad, group_size in groups:
         item_to_categorize = (representative_ad, group_size)
 
         if group_size >= 5:
@@ -304,42 +269,97 @@ async def business_chosen(call: types.CallbackQuery, state: FSMContext):
 
     # --- 4. Надсилаємо звіт ---
     await call.message.delete()
-    await call.message.answer(f"<b>Звіт для: {business_name}</b> ({period_str})", parse_mode="HTML")
+    # Усе надсилання йде через чергу з лімітами Telegram: фото склеюються в медіагрупи
+    send_scheduler.enqueue_text(call.message, f"<b>Звіт для: {business_name}</b> ({period_str})", parse_mode="HTML")
 
-    await send_ads_category(
+    send_ads_category(
         call.message, top_performers,
         f"<b>🔥 Креативи-лідери ({len(top_performers)} унікальних, 5+ варіацій)</b>"
     )
-    await send_ads_category(
+    send_ads_category(
         call.message, mid_performers,
         f"<b>💪 Стабільні креативи ({len(mid_performers)} унікальних, 2-4 варіації)</b>"
     )
-    await send_ads_category(
+    send_ads_category(
         call.message, single_creatives,
         f"<b>🤔 Одиничні креативи/тести ({len(single_creatives)} унікальних)</b>"
     )
 
-    await call.message.answer("✅ Звіт готовий!")
+    send_scheduler.enqueue_text(call.message, "✅ Звіт готовий!")
     await state.clear()
 
 @router.message(F.text.in_({"⚙️ Запустити скрапінг", "/scrape"}))
 async def manual_scrape_command(message: types.Message):
     """
-    Обробник для ручного запуску процесу скрапінгу з перевіркою стану.
+    Обробник для ручного запуску скрапінгу: ставить задачі для всіх бізнесів у чергу воркерів
+    і одразу відповідає номером запуску. Далі це повідомлення оновлюється з прогресом.
     """
-    # Перевіряємо, чи не йде вже скрапінг
-    if shared_state.is_scraping:
-        await message.answer("⏳ Процес скрапінгу вже запущено. Будь ласка, зачекайте його завершення.")
-        return
+    async with AsyncSession() as session:
+        business_ids = (await session.execute(select(Business.id))).scalars().all()
 
-    await message.answer("⚙️ Починаю процес скрапінгу... Це може зайняти кілька хвилин.")
+    if not business_ids:
+        await message.answer("У базі даних немає бізнесів для скрапінгу.")
+        return
 
     try:
-        await scrape_all()
-        await message.answer("✅ Скрапінг успішно завершено!")
+        run_id, enqueued, skipped = await start_run(business_ids, message.chat.id)
     except Exception as e:
-        logger.error(f"Помилка під час ручного скрапінгу: {e}")
-        await message.answer(f"❌ Під час скрапінгу сталася помилка.\nДеталі: {e}")
+        logger.error(f"Помилка під час постановки скрапінгу в чергу: {e}")
+        await message.answer(f"❌ Не вдалося запустити скрапінг.\nДеталі: {e}")
+        return
+    if skipped:
+        SCRAPE_CONTENTION.inc(skipped, source='manual')
+
+    if run_id is None:
+        await message.answer("⏳ Усі бізнеси вже в черзі або в роботі, новий запуск не потрібен.\n"
+                             "Стан черги: /scrape_status")
+        return
+
+    status_message = await message.answer(
+        f"⚙️ Запуск #{run_id}: скрапінг поставлено в чергу для {enqueued} бізнесів"
+        f"{f' (ще {skipped} вже в роботі)' if skipped else ''}."
+    )
+    await set_run_message(run_id, status_message.message_id)
+    start_tracking(message.bot, run_id)
+
+
+@router.message(Command('scrape_status'))
+async def scrape_status_command(message: types.Message):
+    """Активні задачі скрапінгу, незавершені запуски та останні результати."""
+    overview = await queue_overview()
+    lines = []
+
+    for run_id in overview['open_runs']:
+        progress = await run_progress(run_id)
+        if progress is not None:
+            lines.append(format_progress(progress))
+            lines.append('')
+
+    if overview['active']:
+        lines.append(f"🔧 Активні задачі ({len(overview['active'])}):")
+        # Обмеження, щоб відповідь вмістилась в одне повідомлення Telegram
+        for job in overview['active'][:30]:
+            name = job.business.name if job.business else job.business_id
+            if job.status == 'running':
+                lines.append(f"• #{job.id} {name} — в роботі ({job.lease_owner}, спроба {job.attempts})")
+            else:
+                lines.append(f"• #{job.id} {name} — в черзі")
+        if len(overview['active']) > 30:
+            lines.append(f"…і ще {len(overview['active']) - 30}")
+    else:
+        lines.append("💤 Активних задач немає.")
+
+    if overview['recent']:
+        lines.append("\n🕓 Останні завершені:")
+        for job in overview['recent']:
+            name = job.business.name if job.business else job.business_id
+            finished = job.finished_at.strftime('%d.%m %H:%M') if job.finished_at else '—'
+            if job.status == 'done':
+                lines.append(f"• {finished} {name}: 🆕 {job.new_ads} · 🔄 {job.updated_ads} · 💤 {job.deactivated_ads}")
+            else:
+                lines.append(f"• {finished} {name}: ❌ {job.error}")
+
+    await message.answer('\n'.join(lines))
 
 
 @router.message(F.text.in_({"🗂️ Звіт по всіх", "/reportall"}))
@@ -356,16 +376,15 @@ async def report_all_start(message: types.Message, state: FSMContext):
     await state.set_state(ReportAllState.waiting_for_period)
 
 
-@router.callback_query(ReportAllState.waiting_for_period)
+@router.callback_query(ReportAllState.waiting_for_period, F.data.startswith("reportall_period_"))
 async def period_chosen_all(call: types.CallbackQuery, state: FSMContext):
     """Обробляє вибір періоду для повного звіту."""
     await call.answer()
     period = call.data.split('_')[-1]
     await state.update_data(period=period)
 
-    session = Session()
-    businesses = session.query(Business).all()
-    session.close()
+    async with AsyncSession() as session:
+        businesses = (await session.execute(select(Business))).scalars().all()
 
     buttons = [[InlineKeyboardButton(text=b.name, callback_data=f"reportall_biz_{b.id}")] for b in businesses]
     buttons.append([InlineKeyboardButton(text="📈 Всі бізнеси", callback_data="reportall_biz_all")])
@@ -376,83 +395,72 @@ async def period_chosen_all(call: types.CallbackQuery, state: FSMContext):
     await state.set_state(ReportAllState.waiting_for_business)
 
 
-@router.callback_query(ReportAllState.waiting_for_business)
+@router.callback_query(ReportAllState.waiting_for_business, F.data.startswith("reportall_biz_"))
 async def business_chosen_all(call: types.CallbackQuery, state: FSMContext):
-    """Фінальний крок. Формує і надсилає повний звіт БЕЗ фільтрації по хешу."""
+    """Фінальний крок. Надсилає першу сторінку повного звіту БЕЗ фільтрації по хешу."""
 
     await call.answer() # для уникнення таймауту додано, але всеодно прилітаж помилка про флуд
 
-    await call.message.edit_text("⏳ Готую **повний** звіт...")
-
     user_data = await state.get_data()
     period = user_data['period']
     business_id = call.data.split('_')[-1]
+    await state.clear()
 
-    session = Session()
-    query = session.query(AdCreative).options(joinedload(AdCreative.business))
-
-    if period != 'all':
-        query = query.filter(AdCreative.is_active == True)
-
-    today = date.today()
-    if period == 'today':
-        start_date = today
-        query = query.filter(AdCreative.start_date == start_date)
-        period_str = f"за {today.strftime('%d.%m.%Y')}"
-    elif period == 'week':
-        start_date = today - timedelta(days=7)
-        query = query.filter(AdCreative.start_date >= start_date)
-        period_str = f"з {start_date.strftime('%d.%m')} по {today.strftime('%d.%m')}"
-    elif period == 'month':
-        start_date = today - timedelta(days=30)
-        query = query.filter(AdCreative.start_date >= start_date)
-        period_str = f"за останні 30 днів"
+    await call.message.edit_text("⏳ Готую **повний** звіт...")
+    sent = await send_full_report_page(call.message, period, business_id)
+    if sent:
+        await call.message.delete()
     else:
-        period_str = "за весь час"
-
-    if business_id != 'all':
-        query = query.filter(AdCreative.business_id == int(business_id))
-
-    ads = query.order_by(AdCreative.business_id, AdCreative.start_date.desc()).all()
-    session.close()
-
-    if not ads:
         await call.message.edit_text("🤷‍♂️ За обраними критеріями нічого не знайдено.")
-        await state.clear()
-        return
 
-    ads_by_business = defaultdict(list)
-    for ad in ads:
-        ads_by_business[ad.business].append(ad)
-
-    await call.message.delete()
 
-    for business, business_ads in ads_by_business.items():
-        header_text = (f"<b>{business.name}</b>\n"
-                       f"Всі креативи {period_str} (знайдено: {len(business_ads)}):")
-        await call.message.answer(header_text, parse_mode="HTML")
-
-        media_group = []
-        for ad in business_ads:
-            if ad.local_path:
-                try:
-                    media_group.append(InputMediaPhoto(media=FSInputFile(ad.local_path)))
-                    if len(media_group) == 10:
-                        await call.message.answer_media_group(media_group)
-                        media_group = []
-                except Exception as e:
-                    logger.error(f"Помилка при додаванні фото в групу: {e}")
-
-        if media_group:
-            await call.message.answer_media_group(media_group)
-
-    await call.message.answer("✅ Повний звіт готовий!")
-    await state.clear()
+@router.callback_query(F.data.startswith(f"{PAGE_CALLBACK_PREFIX}:"))
+async def report_all_next_page(call: types.CallbackQuery):
+    """Кнопка "наступна сторінка" повного звіту: курсор зашитий у callback_data, стан FSM не потрібен."""
+    await call.answer()
+    period, business_id, cursor = unpack_page_callback(call.data)
+    # Прибираємо кнопку, щоб повторне натискання не надіслало ту саму сторінку ще раз
+    await call.message.edit_reply_markup(reply_markup=None)
+    await send_full_report_page(call.message, period, business_id, cursor)
 
 
-async def send_ads_category(message: types.Message, ads_with_counts: list, header: str):
+async def send_full_report_page(message: types.Message, period: str, business_id: str, after: tuple | None = None) -> int:
+    """
+    Ставить у чергу надсилання одну сторінку повного звіту, поки рядки ще надходять з курсора.
+    Наприкінці — кнопка наступної сторінки або повідомлення про завершення. Повертає кількість креативів.
+    """
+    _, period_str = period_filters(period)
+    sent, last_ad, current_business = 0, None, after[0] if after else None
+    # aclosing закриває сесію й серверний курсор одразу при виході з циклу на межі сторінки
+    async with aclosing(stream_full_report_page(period, business_id, after)) as ads:
+        async for ad in ads:
+            if sent == REPORT_PAGE_SIZE:
+                # Зайвий рядок: значить, є наступна сторінка
+                keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                    text="➡️ Наступна сторінка",
+                    callback_data=pack_page_callback(period, business_id, cursor_of(last_ad)),
+                )]])
+                send_scheduler.enqueue_text(message, f"Показано {REPORT_PAGE_SIZE} креативів.", reply_markup=keyboard)
+                return sent
+
+            if ad.business_id != current_business or last_ad is None:
+                suffix = ' (продовження)' if ad.business_id == current_business else ''
+                send_scheduler.enqueue_text(
+                    message, f"<b>{ad.business.name}</b>\nВсі креативи {period_str}{suffix}:", parse_mode="HTML",
+                )
+                current_business = ad.business_id
+            # Черга сама збирає фото поспіль у медіагрупи по 10
+            send_scheduler.enqueue_photo(message, ad)
+            sent, last_ad = sent + 1, ad
+
+    if sent or after is not None:
+        send_scheduler.enqueue_text(message, "✅ Повний звіт готовий!")
+    return sent
+
+
+def send_ads_category(message: types.Message, ads_with_counts: list, header: str):
     """
-    Надсилає заголовок і фото для заданої категорії оголошень.
+    Ставить у чергу надсилання заголовок і фото для заданої категорії оголошень.
     Приймає список кортежів (оголошення, кількість схожих).
     """
     if not ads_with_counts:
@@ -460,12 +468,9 @@ async def send_ads_category(message: types.Message, ads_with_counts: list, heade
 
     sorted_ads = sorted(ads_with_counts, key=lambda item: item[1], reverse=True)
 
-    await message.answer(header, parse_mode="HTML")
+    send_scheduler.enqueue_text(message, header, parse_mode="HTML")
     for ad, count in sorted_ads:
         if ad.local_path:
             caption = (f"Знайдено схожих у цьому звіті: <b>{count}</b>\n"
                        f"Тривалість: {ad.duration_days} дн.")
-            try:
-                await message.answer_photo(FSInputFile(ad.local_path), caption=caption, parse_mode="HTML")
-            except Exception as e:
-                logger.error(f"Помилка відправки фото {ad.id}: {e}")
\ No newline at end of file
+            send_scheduler.enqueue_photo(message, ad, caption=caption)
\ No newline at end of file
@@ -0,0 +1,80 @@
+import logging
+
+from aiogram import types
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaPhoto
+from sqlalchemy import update
+
+from database.models import AsyncSession, AdCreative, ImageBlob
+
+logger = logging.getLogger(__name__)
+
+
+def photo_source(ad: AdCreative, use_cache: bool = True):
+    """
+    file_id з кешу блоба, якщо Telegram уже бачив це зображення, інакше файл для завантаження —
+    стиснена копія для звітів, а не оригінал.
+    """
+    blob = ad.image_blob
+    if use_cache and blob is not None and blob.tg_file_id:
+        return blob.tg_file_id
+    return FSInputFile(blob.local_path if blob is not None and blob.local_path else ad.local_path)
+
+
+async def remember_file_ids(ads: list[AdCreative], sent: list[types.Message]):
+    """Зберігає file_id з відповіді Telegram для блобів, які щойно було завантажено."""
+    updates = {}
+    for ad, sent_message in zip(ads, sent):
+        blob = ad.image_blob
+        if blob is None or not sent_message.photo:
+            continue
+        file_id = sent_message.photo[-1].file_id
+        if blob.tg_file_id != file_id:
+            blob.tg_file_id = file_id
+            updates[blob.digest] = file_id
+    if not updates:
+        return
+
+    try:
+        async with AsyncSession() as session:
+            await session.execute(update(ImageBlob), [{'digest': digest, 'tg_file_id': file_id}
+                                                      for digest, file_id in updates.items()])
+            await session.commit()
+    except Exception as e:
+        logger.error(f"Не вдалося зберегти file_id: {e}")
+
+
+def _uses_cache(ads: list[AdCreative]) -> bool:
+    return any(ad.image_blob is not None and ad.image_blob.tg_file_id for ad in ads)
+
+
+async def answer_photo(message: types.Message, ad: AdCreative, **kwargs) -> types.Message:
+    """answer_photo з кешем file_id; якщо Telegram відхилив file_id — завантажує файл заново."""
+    try:
+        sent = await message.answer_photo(photo_source(ad), **kwargs)
+    except TelegramBadRequest:
+        if not _uses_cache([ad]):
+            raise
+        logger.warning(f"Telegram відхилив file_id для {ad.fb_ad_id}, завантажую файл повторно.")
+        sent = await message.answer_photo(photo_source(ad, use_cache=False), **kwargs)
+    await remember_file_ids([ad], [sent])
+    return sent
+
+
+async def answer_media_group(message: types.Message, ads: list[AdCreative], captions: list | None = None) -> list[types.Message]:
+    """answer_media_group з кешем file_id і тим самим запасним завантаженням."""
+    captions = captions or [None] * len(ads)
+
+    def build(use_cache: bool):
+        return [InputMediaPhoto(media=photo_source(ad, use_cache), caption=caption, parse_mode="HTML" if caption else None)
+                for ad, caption in zip(ads, captions)]
+
+    try:
+        sent = await message.answer_media_group(build(use_cache=True))
+    except TelegramBadRequest:
+        if not _uses_cache(ads):
+            raise
+        logger.warning("Telegram відхилив file_id у медіагрупі, завантажую файли повторно.")
+        sent = await message.answer_media_group(build(use_cache=False))
+    await remember_file_ids(ads, sent)
+    return sent
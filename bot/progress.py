@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from config import SCRAPE_PROGRESS_EDIT_SECONDS
+from scheduler.jobs import run_progress, unfinished_run_ids
+
+logger = logging.getLogger(__name__)
+
+# Посилання на фонові задачі, щоб їх не прибрав збирач сміття
+_trackers: dict[int, asyncio.Task] = {}
+
+
+def format_elapsed(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes} хв {seconds:02d} с" if minutes else f"{seconds} с"
+
+
+def format_progress(progress: dict) -> str:
+    counts = progress['counts']
+    closed = counts['done'] + counts['failed']
+    title = "✅ Скрапінг завершено" if progress['finished'] else "⚙️ Скрапінг триває"
+    status_line = f"Бізнесів: {closed}/{progress['total']}, в роботі: {counts['running']}, в черзі: {counts['pending']}"
+    if counts['failed']:
+        status_line += f", помилок: {counts['failed']}"
+    lines = [
+        f"{title} (запуск #{progress['run_id']})",
+        status_line,
+        f"🆕 Нових: {progress['new']} · 🔄 Оновлено: {progress['updated']} · 💤 Деактивовано: {progress['deactivated']}",
+        f"⏱ {format_elapsed(progress['elapsed'])}",
+    ]
+    if progress['running_names']:
+        lines.append(f"Зараз: {', '.join(progress['running_names'])}")
+    if progress['finished'] and progress['failed_names']:
+        lines.append(f"❌ Не вдалося: {', '.join(progress['failed_names'])}")
+    return '\n'.join(lines)
+
+
+def _change_marker(progress: dict) -> tuple:
+    # Час не враховується: повідомлення редагується лише коли якийсь бізнес змінив стан
+    counts = progress['counts']
+    return (counts['pending'], counts['running'], counts['done'], counts['failed'],
+            tuple(progress['running_names']), progress['finished'])
+
+
+async def _edit(bot: Bot, chat_id: int, message_id: int, text: str) -> bool:
+    """False — якщо Telegram попросив почекати і редагування треба повторити."""
+    try:
+        await bot.edit_message_text(text, chat_id=chat_id, message_id=message_id)
+    except TelegramRetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        return False
+    except TelegramBadRequest as e:
+        # "message is not modified" та видалені повідомлення не є помилкою трекера
+        logger.debug(f"Не вдалося оновити прогрес у чаті {chat_id}: {e}")
+    return True
+
+
+async def track_run(bot: Bot, run_id: int):
+    """
+    Оновлює повідомлення з прогресом запуску, доки всі його задачі не закриються.
+    Редагування не частіше ніж раз на SCRAPE_PROGRESS_EDIT_SECONDS і лише при зміні стану.
+    """
+    last_marker = None
+    try:
+        while True:
+            progress = await run_progress(run_id)
+            if progress is None or progress['message_id'] is None:
+                return
+            marker = _change_marker(progress)
+            if marker != last_marker:
+                if not await _edit(bot, progress['chat_id'], progress['message_id'], format_progress(progress)):
+                    continue
+                last_marker = marker
+            if progress['finished']:
+                logger.info(f"Запуск #{run_id} завершено за {format_elapsed(progress['elapsed'])}.")
+                return
+            await asyncio.sleep(SCRAPE_PROGRESS_EDIT_SECONDS)
+    except Exception as e:
+        logger.error(f"Трекер запуску #{run_id} зупинився: {e}")
+    finally:
+        _trackers.pop(run_id, None)
+
+
+def start_tracking(bot: Bot, run_id: int):
+    if run_id not in _trackers:
+        _trackers[run_id] = asyncio.create_task(track_run(bot, run_id))
+
+
+async def resume_tracking(bot: Bot):
+    """Після рестарту бота продовжує оновлювати повідомлення незавершених запусків."""
+    for run_id in await unfinished_run_ids():
+        start_tracking(bot, run_id)
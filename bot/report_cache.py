@@ -0,0 +1,72 @@
+import time
+from collections import OrderedDict
+from datetime import date
+
+from config import REPORT_CACHE_SIZE, REPORT_CACHE_TTL
+from database.crud import get_data_generation
+from database.models import AsyncSession
+
+
+class ReportCache:
+    """
+    LRU-кеш готових звітів з TTL. Ключ включає покоління даних з бази, яке збільшують
+    скрапінг і очищення, тож після будь-якої зміни — навіть в окремому процесі воркера —
+    старі записи просто перестають збігатися і витісняються.
+    """
+
+    def __init__(self, max_entries: int = REPORT_CACHE_SIZE, ttl: int = REPORT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = None
+
+    @staticmethod
+    def make_key(kind: str, period: str, business_id: str, generation) -> tuple:
+        # Періоди відносні ("сьогодні", "тиждень"), тому в ключі є й поточна дата
+        return kind, period, business_id, date.today(), generation
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, kind: str, period: str, business_id: str, loader):
+        """Повертає закешований звіт або будує його через `loader(period, business_id)`."""
+        async with AsyncSession() as session:
+            self.generation = await get_data_generation(session)
+        key = self.make_key(kind, period, business_id, self.generation)
+        value = self.get(key)
+        if value is None:
+            value = await loader(period, business_id)
+            self.put(key, value)
+        return value
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+            'generation': str(self.generation),
+        }
+
+
+report_cache = ReportCache()
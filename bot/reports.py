@@ -0,0 +1,162 @@
+from datetime import date, timedelta
+
+from sqlalchemy import select, func, and_, or_
+from sqlalchemy.orm import joinedload
+
+from bot.report_cache import report_cache
+from config import REPORT_PAGE_SIZE, REPORT_STREAM_CHUNK
+from database.models import AsyncSession, Business, AdCreative
+
+
+def period_filters(period: str) -> tuple[list, str]:
+    """Фільтри AdCreative і підпис для вибраного періоду звіту."""
+    filters = []
+    if period != 'all':
+        filters.append(AdCreative.is_active == True)
+
+    today = date.today()
+    if period == 'today':
+        filters.append(AdCreative.start_date == today)
+        period_str = f"за {today.strftime('%d.%m.%Y')}"
+    elif period == 'week':
+        start_date = today - timedelta(days=7)
+        filters.append(AdCreative.start_date >= start_date)
+        period_str = f"з {start_date.strftime('%d.%m')} по {today.strftime('%d.%m')}"
+    elif period == 'month':
+        start_date = today - timedelta(days=30)
+        filters.append(AdCreative.start_date >= start_date)
+        period_str = f"за останні 30 днів"
+    else:
+        period_str = "за весь час"
+    return filters, period_str
+
+
+def unique_report_query(period: str, business_id_str: str):
+    """
+    Групування вже зроблене при скрапінгу, тож звіт — один запит по cluster_id.
+    Представник групи — найсвіжіший креатив кластера серед відфільтрованих, розмір — їх кількість.
+    """
+    filters, period_str = period_filters(period)
+    filters += [AdCreative.cluster_id.isnot(None), AdCreative.local_path.isnot(None)]
+    if business_id_str != 'all':
+        filters.append(AdCreative.business_id == int(business_id_str))
+
+    ranked = (
+        select(
+            AdCreative.id.label('ad_id'),
+            func.count().over(partition_by=AdCreative.cluster_id).label('group_size'),
+            func.row_number().over(
+                partition_by=AdCreative.cluster_id,
+                order_by=(AdCreative.start_date.desc(), AdCreative.id.desc()),
+            ).label('position'),
+        )
+        .where(*filters)
+        .subquery()
+    )
+    query = (
+        select(AdCreative, ranked.c.group_size)
+        .join(ranked, ranked.c.ad_id == AdCreative.id)
+        .where(ranked.c.position == 1)
+        .options(joinedload(AdCreative.business), joinedload(AdCreative.image_blob))
+        .order_by(AdCreative.start_date.desc())
+    )
+    return query, period_str
+
+
+def full_report_query(period: str, business_id_str: str, after: tuple | None = None):
+    """
+    Всі креативи періоду з картинкою, без фільтрації по хешу, у порядку
+    (business_id, start_date DESC NULLS LAST, id DESC): креативи з невідомою датою старту йдуть
+    наприкінці свого бізнесу. `after` — курсор (business_id, start_date, id) останнього надісланого
+    креативу: сторінка продовжується одразу після нього, без OFFSET.
+    """
+    filters, period_str = period_filters(period)
+    filters.append(AdCreative.local_path.isnot(None))
+    if business_id_str != 'all':
+        filters.append(AdCreative.business_id == int(business_id_str))
+    if after is not None:
+        business_id, start_date, ad_id = after
+        # Змішаний напрям сортування і NULL наприкінці, тому порівняння кортежів розписане вручну
+        if start_date is None:
+            same_business_after = and_(AdCreative.start_date.is_(None), AdCreative.id < ad_id)
+        else:
+            same_business_after = or_(
+                AdCreative.start_date < start_date,
+                and_(AdCreative.start_date == start_date, AdCreative.id < ad_id),
+                AdCreative.start_date.is_(None),
+            )
+        filters += [
+            # Надлишкова умова дає індексу межу діапазону, а OR нижче — точне продовження
+            AdCreative.business_id >= business_id,
+            or_(AdCreative.business_id > business_id, and_(AdCreative.business_id == business_id, same_business_after)),
+        ]
+
+    query = (
+        select(AdCreative)
+        .options(joinedload(AdCreative.business), joinedload(AdCreative.image_blob))
+        .where(*filters)
+        .order_by(AdCreative.business_id, AdCreative.start_date.desc().nulls_last(), AdCreative.id.desc())
+    )
+    return query, period_str
+
+
+async def _load_unique_report(period: str, business_id_str: str) -> dict:
+    query, period_str = unique_report_query(period, business_id_str)
+    business_name = "Всі бізнеси"
+    async with AsyncSession() as session:
+        if business_id_str != 'all':
+            business = await session.get(Business, int(business_id_str))
+            if business:
+                business_name = business.name
+        groups = [(ad, group_size) for ad, group_size in await session.execute(query)]
+
+    return {'business_name': business_name, 'period_str': period_str, 'groups': groups}
+
+
+async def stream_full_report_page(period: str, business_id_str: str, after: tuple | None = None,
+                                  page_size: int = REPORT_PAGE_SIZE):
+    """
+    Потоково віддає до `page_size + 1` креативів сторінки через серверний курсор (yield_per):
+    у пам'яті не більше REPORT_STREAM_CHUNK рядків, а перша сторінка приходить за час, що не
+    залежить від розміру таблиці. Зайвий (page_size + 1)-й креатив означає, що є наступна сторінка.
+    """
+    query, _ = full_report_query(period, business_id_str, after)
+    query = query.limit(page_size + 1).execution_options(yield_per=REPORT_STREAM_CHUNK)
+    async with AsyncSession() as session:
+        result = await session.stream_scalars(query)
+        async for ad in result:
+            yield ad
+
+
+def cursor_of(ad: AdCreative) -> tuple:
+    return ad.business_id, ad.start_date, ad.id
+
+
+# Коротші коди періодів, щоб callback_data вмістилась у 64 байти
+PERIOD_CODES = {'today': 't', 'week': 'w', 'month': 'm', 'all': 'a'}
+PAGE_CALLBACK_PREFIX = 'rap'
+
+
+def pack_page_callback(period: str, business_id_str: str, cursor: tuple) -> str:
+    """
+    callback_data кнопки "наступна сторінка": rap:<період>:<бізнес>:<business_id>:<дата>:<id>,
+    дата — порядковий номер дня, порожня для невідомої дати старту.
+    """
+    business_id, start_date, ad_id = cursor
+    ordinal = start_date.toordinal() if start_date else ''
+    data = f"{PAGE_CALLBACK_PREFIX}:{PERIOD_CODES[period]}:{business_id_str}:{business_id}:{ordinal}:{ad_id}"
+    if len(data.encode()) > 64:
+        raise ValueError(f"callback_data довша за 64 байти: {data}")
+    return data
+
+
+def unpack_page_callback(data: str) -> tuple[str, str, tuple]:
+    _, period_code, business_id_str, business_id, ordinal, ad_id = data.split(':')
+    period = next(period for period, code in PERIOD_CODES.items() if code == period_code)
+    start_date = date.fromordinal(int(ordinal)) if ordinal else None
+    return period, business_id_str, (int(business_id), start_date, int(ad_id))
+
+
+async def load_unique_report(period: str, business_id_str: str) -> dict:
+    return await report_cache.get_or_load('unique', period, business_id_str, _load_unique_report)
+
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram import types
+from aiogram.exceptions import TelegramRetryAfter
+
+from bot.media import answer_photo, answer_media_group
+from config import TG_GLOBAL_RATE, TG_CHAT_RATE, TG_GROUP_CHAT_RATE, TG_CHAT_BURST
+from metrics import phase
+
+logger = logging.getLogger(__name__)
+
+MEDIA_GROUP_LIMIT = 10
+MAX_RETRIES = 5
+
+
+class TokenBucket:
+    """Класичне відро токенів: `rate` токенів за секунду, не більше `capacity` у запасі."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1):
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class _ChatQueue:
+    def __init__(self, chat_id: int):
+        rate = TG_GROUP_CHAT_RATE if chat_id < 0 else TG_CHAT_RATE
+        self.bucket = TokenBucket(rate, TG_CHAT_BURST)
+        self.items = deque()
+        self.task: asyncio.Task | None = None
+
+
+class SendScheduler:
+    """
+    Черга вихідних повідомлень на кожен чат. Тримає ліміти Telegram відрами токенів
+    (на чат і загальне), чекає стільки, скільки просить RetryAfter, і склеює
+    послідовні фото в медіагрупи по 10 з підписами.
+    """
+
+    def __init__(self, global_rate: float = TG_GLOBAL_RATE):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int, _ChatQueue] = {}
+        self.sent_messages = 0
+        self.retry_after_waits = 0
+        self.failed = 0
+        self._latencies = deque(maxlen=1000)
+
+    def _chat(self, chat_id: int) -> _ChatQueue:
+        if chat_id not in self._chats:
+            self._chats[chat_id] = _ChatQueue(chat_id)
+        return self._chats[chat_id]
+
+    def _enqueue(self, message: types.Message, item: dict):
+        chat = self._chat(message.chat.id)
+        item.update(message=message, enqueued=time.monotonic())
+        chat.items.append(item)
+        if chat.task is None or chat.task.done():
+            chat.task = asyncio.create_task(self._run(message.chat.id, chat))
+
+    def enqueue_text(self, message: types.Message, text: str, **kwargs):
+        self._enqueue(message, {'kind': 'text', 'text': text, 'kwargs': kwargs})
+
+    def enqueue_photo(self, message: types.Message, ad, caption: str | None = None):
+        self._enqueue(message, {'kind': 'photo', 'ad': ad, 'caption': caption})
+
+    def _next_batch(self, chat: _ChatQueue) -> list[dict]:
+        """Текст іде окремо, а фото, що стоять поспіль, збираються в одну медіагрупу."""
+        first = chat.items.popleft()
+        batch = [first]
+        if first['kind'] == 'photo':
+            while chat.items and chat.items[0]['kind'] == 'photo' and len(batch) < MEDIA_GROUP_LIMIT:
+                batch.append(chat.items.popleft())
+        return batch
+
+    async def _deliver(self, batch: list[dict]):
+        first = batch[0]
+        message = first['message']
+        if first['kind'] == 'text':
+            await message.answer(first['text'], **first['kwargs'])
+        elif len(batch) == 1:
+            caption = first['caption']
+            await answer_photo(message, first['ad'], caption=caption, parse_mode="HTML" if caption else None)
+        else:
+            await answer_media_group(message, [item['ad'] for item in batch], [item['caption'] for item in batch])
+
+    async def _run(self, chat_id: int, chat: _ChatQueue):
+        while chat.items:
+            batch = self._next_batch(chat)
+            for attempt in range(MAX_RETRIES):
+                await chat.bucket.acquire()
+                await self.global_bucket.acquire(len(batch))
+                try:
+                    with phase('telegram_send'):
+                        await self._deliver(batch)
+                except TelegramRetryAfter as e:
+                    self.retry_after_waits += 1
+                    logger.warning(f"Флуд-контроль у чаті {chat_id}: чекаю {e.retry_after} с.")
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                except Exception as e:
+                    self.failed += len(batch)
+                    logger.error(f"Помилка надсилання в чат {chat_id}: {e}")
+                    break
+                now = time.monotonic()
+                self.sent_messages += len(batch)
+                self._latencies.extend(now - item['enqueued'] for item in batch)
+                break
+            else:
+                self.failed += len(batch)
+                logger.error(f"Не вдалося надіслати {len(batch)} повідомлень у чат {chat_id} після {MAX_RETRIES} спроб.")
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2) if latencies else 0.0
+
+        return {
+            'queue_depth': sum(len(chat.items) for chat in self._chats.values()),
+            'active_chats': sum(1 for chat in self._chats.values() if chat.items),
+            'sent_messages': self.sent_messages,
+            'failed': self.failed,
+            'retry_after_waits': self.retry_after_waits,
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+        }
+
+
+send_scheduler = SendScheduler()
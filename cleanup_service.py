@@ -1,53 +1,178 @@
-import shutil
 import asyncio
-from pathlib import Path
-from sqlalchemy.orm import Session
-from database.models import Session as DBSession, AdCreative
+import logging
+import os
+import re
+import time
+from datetime import date, timedelta
 
-async def clean_database():
-    session: Session = DBSession()
+from config import RETENTION_DAYS, CLEANUP_BATCH_SIZE, CLEANUP_INTERVAL_SECONDS, ORPHAN_MIN_AGE_SECONDS
+from database.crud import (select_expired_ads, delete_ads, refresh_ref_counts, delete_unreferenced_blobs,
+                           existing_blob_digests, get_known_ad_ids, bump_data_generation, delete_empty_clusters)
+from database.models import AsyncSession
+from facebook.image_store import image_store
+
+logger = logging.getLogger(__name__)
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+# До сховища за вмістом креатив зберігався окремим файлом оголошення: images/<fb_ad_id>.jpg
+LEGACY_NAME_RE = re.compile(r'^(\d+)\.jpg$')
+SWEEP_BATCH_SIZE = 1000
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} МБ"
+
+
+def _unlink_files(paths) -> int:
+    """Видаляє файли і повертає кількість звільнених байтів."""
+    freed = 0
+    for path in paths:
+        try:
+            freed += os.stat(path).st_size
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Не вдалося видалити {path}: {e}")
+    return freed
+
+
+async def purge_expired_ads(retention_days: int = RETENTION_DAYS, batch_size: int = CLEANUP_BATCH_SIZE) -> dict:
+    """
+    Видаляє неактивні оголошення, яких не бачили понад `retention_days` днів, пачками по `batch_size`
+    в окремих транзакціях, тож таблиця ніколи не блокується цілком. Блоби видаляються лише тоді,
+    коли на них не лишилось жодного посилання; файли — після коміту. Оголошення без блобу
+    (збережені до сховища за вмістом) володіють своїм файлом local_path одноосібно, тож він видаляється разом з ними.
+    Кластери, в яких не лишилось оголошень, видаляються в тій самій транзакції.
+    """
+    cutoff = date.today() - timedelta(days=retention_days)
+    totals = {'ads': 0, 'blobs': 0, 'clusters': 0, 'legacy_files': 0, 'bytes': 0}
+    while True:
+        async with AsyncSession() as session:
+            expired = await select_expired_ads(session, cutoff, batch_size)
+            if not expired:
+                break
+            await delete_ads(session, [ad_id for ad_id, *_ in expired])
+            digests = {digest for _, digest, _, _ in expired if digest}
+            await refresh_ref_counts(session, digests)
+            removed = await delete_unreferenced_blobs(session, digests)
+            clusters = await delete_empty_clusters(session, {cluster_id for *_, cluster_id in expired if cluster_id})
+            # Закешовані звіти могли посилатися на ці оголошення і файли
+            await bump_data_generation(session)
+            await session.commit()
+
+        legacy = {local_path for _, digest, local_path, _ in expired if not digest and local_path}
+        files = {path for _, *paths in removed for path in paths if path} | legacy
+        freed = await asyncio.to_thread(_unlink_files, files)
+        totals['ads'] += len(expired)
+        totals['blobs'] += len(removed)
+        totals['clusters'] += clusters
+        totals['legacy_files'] += len(legacy)
+        totals['bytes'] += freed
+        logger.info(f"🧹 Пачка: видалено оголошень {len(expired)}, блобів {len(removed)}, кластерів {clusters}, "
+                    f"звільнено {_format_bytes(freed)}.")
+        if len(expired) < batch_size:
+            break
+    return totals
+
+
+def _scan_files(root: str):
+    """Потоково обходить дерево через os.scandir, не збираючи список усіх файлів у пам'яті."""
     try:
-        session.query(AdCreative).delete()
-        session.commit()
-        print("Data Base cleaned")
-    except Exception as e:
-        session.rollback()
-        print(f"Cleanup failed {e}")
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from _scan_files(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+    except FileNotFoundError:
+        return
+
+
+def _scan_batch(entries, root: str, tmp_dir: str, deadline: float) -> tuple | None:
+    """
+    Бере з обходу `entries` наступну пачку: до SWEEP_BATCH_SIZE кандидатів (дайджести блобів з їхніми
+    файлами і старі файли оголошень) та застарілі .part у tmp. Виконується в потоці, бо scandir і stat блокують.
+    Повертає (перевірено файлів, файли tmp, {digest: [шляхи]}, {fb_ad_id: шлях}) або None, коли обхід закінчено.
+    """
+    scanned, stale_tmp, candidates, legacy = 0, [], {}, {}
+    for entry in entries:
+        scanned += 1
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime > deadline:
+                continue
+        except FileNotFoundError:
+            continue
+        directory = os.path.dirname(entry.path)
+        if directory == tmp_dir:
+            stale_tmp.append(entry.path)
+            continue
+        legacy_match = LEGACY_NAME_RE.match(entry.name) if directory == root else None
+        if legacy_match:
+            legacy[legacy_match.group(1)] = entry.path
+        else:
+            # <digest>.jpg, <digest>.report.jpg, <digest>.thumb.jpg
+            digest = entry.name.split('.', 1)[0]
+            if not DIGEST_RE.match(digest):
+                continue
+            candidates.setdefault(digest, []).append(entry.path)
+        if len(candidates) + len(legacy) >= SWEEP_BATCH_SIZE:
+            break
+    if not scanned:
+        return None
+    return scanned, stale_tmp, candidates, legacy
+
+
+async def sweep_orphan_files(min_age: int = ORPHAN_MIN_AGE_SECONDS) -> dict:
+    """
+    Видаляє файли сховища, для яких немає блобу в базі, файли images/<fb_ad_id>.jpg видалених оголошень
+    і недокачані .part у tmp. Свіжі файли (молодші за `min_age`) пропускаються: їхній рядок може бути
+    ще не закомічено. Обхід диска йде в потоці пачками, у циклі подій лишаються тільки запити до бази.
+    """
+    deadline = time.time() - min_age
+    totals = {'scanned': 0, 'files': 0, 'bytes': 0}
+    root, tmp_dir = str(image_store.root), str(image_store.tmp_dir)
+    entries = _scan_files(root)
+    try:
+        while (batch := await asyncio.to_thread(_scan_batch, entries, root, tmp_dir, deadline)) is not None:
+            scanned, orphans, candidates, legacy = batch
+            totals['scanned'] += scanned
+            if candidates or legacy:
+                async with AsyncSession() as session:
+                    known = await existing_blob_digests(session, set(candidates))
+                    known_ads = await get_known_ad_ids(session, set(legacy))
+                orphans += [path for digest, paths in candidates.items() if digest not in known for path in paths]
+                orphans += [path for ad_id, path in legacy.items() if ad_id not in known_ads]
+            if orphans:
+                totals['files'] += len(orphans)
+                totals['bytes'] += await asyncio.to_thread(_unlink_files, orphans)
     finally:
-        session.close()
-
-async def clean_images_folder():
-    images_path = Path("images")
-    if images_path.exists() and images_path.is_dir():
-        for item in images_path.iterdir():
-            try:
-                if item.is_file():
-                    item.unlink()
-                elif item.is_dir():
-                    shutil.rmtree(item)
-            except Exception as e:
-                print(f"Can't clean up {item}: {e}")
-        print("Folder cleanup successful")
-    else:
-        print("Folder images doesn't exist")
+        entries.close()
+    return totals
+
 
 async def cleanup():
-    await clean_database()
-    await clean_images_folder()
+    started = time.perf_counter()
+    purged = await purge_expired_ads()
+    logger.info(f"🧹 Ретеншн ({RETENTION_DAYS} дн.): видалено оголошень {purged['ads']}, "
+                f"блобів {purged['blobs']}, кластерів {purged['clusters']}, "
+                f"старих файлів оголошень {purged['legacy_files']}, звільнено {_format_bytes(purged['bytes'])}.")
+    swept = await sweep_orphan_files()
+    logger.info(f"🧹 Осиротілі файли: перевірено {swept['scanned']}, видалено {swept['files']}, "
+                f"звільнено {_format_bytes(swept['bytes'])}. Очищення тривало {time.perf_counter() - started:.1f} с.")
+
 
 async def run_clean_up():
     while True:
-        print("Start cleanup")
+        logger.info("Start cleanup")
         try:
-            asyncio.create_task(cleanup())
-            print("Cleanup completed")
+            await cleanup()
         except Exception as e:
-            print(f"Cleanup failed due {e}")
-
-        await asyncio.sleep(86400)
+            logger.error(f"Cleanup failed due {e}")
 
+        await asyncio.sleep(CLEANUP_INTERVAL_SECONDS)
 
 
 if __name__ == "__main__":
-    clean_database()
-    clean_images_folder()
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(cleanup())
@@ -4,4 +4,100 @@ from dotenv import load_dotenv
 load_dotenv()
 
 POSTGRESQl_LINK = os.getenv("POSTGRESQl_LINK")
-BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
\ No newline at end of file
+BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+
+# Скільки контекстів браузера паралельно обробляють чергу бізнесів
+SCRAPE_CONCURRENCY = int(os.getenv('SCRAPE_CONCURRENCY', 3))
+
+# Завантаження зображень креативів
+DOWNLOAD_MAX_CONNECTIONS = int(os.getenv('DOWNLOAD_MAX_CONNECTIONS', 32))
+DOWNLOAD_PER_HOST_LIMIT = int(os.getenv('DOWNLOAD_PER_HOST_LIMIT', 8))
+DOWNLOAD_RETRIES = int(os.getenv('DOWNLOAD_RETRIES', 3))
+DOWNLOAD_TIMEOUT = int(os.getenv('DOWNLOAD_TIMEOUT', 15))
+
+# Процеси для розрахунку перцептивних хешів (0 = кількість ядер)
+HASH_WORKERS = int(os.getenv('HASH_WORKERS', 0)) or os.cpu_count() or 1
+HASH_BATCH_SIZE = int(os.getenv('HASH_BATCH_SIZE', 16))
+
+# Пул з'єднань з базою даних
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))
+# Окремий маленький пул синхронного рушія (міграції, скрипти), щоб не подвоювати кількість з'єднань
+DB_SYNC_POOL_SIZE = int(os.getenv('DB_SYNC_POOL_SIZE', 1))
+DB_SYNC_MAX_OVERFLOW = int(os.getenv('DB_SYNC_MAX_OVERFLOW', 2))
+
+# Адаптивне прокручування сторінки бібліотеки реклами
+SCROLL_MAX_SCROLLS = int(os.getenv('SCROLL_MAX_SCROLLS', 60))
+SCROLL_MAX_SECONDS = float(os.getenv('SCROLL_MAX_SECONDS', 120))
+SCROLL_IDLE_SECONDS = float(os.getenv('SCROLL_IDLE_SECONDS', 3))
+
+# 'network' — дані оголошень з JSON-відповідей бібліотеки (із запасним пошуком карток у браузері),
+# 'dom' — лише пошук карток у браузері, 'html' — повний HTML через BeautifulSoup
+SCRAPE_EXTRACTION_MODE = os.getenv('SCRAPE_EXTRACTION_MODE', 'network')
+
+# Які запити браузера скасовувати під час скрапінгу (URL креативів лишаються в DOM і JSON)
+BLOCKED_RESOURCE_TYPES = [t.strip() for t in os.getenv('BLOCKED_RESOURCE_TYPES', 'image,media,font').split(',') if t.strip()]
+BLOCKED_URL_PATTERNS = [p.strip() for p in os.getenv(
+    'BLOCKED_URL_PATTERNS',
+    r'google-analytics\.com,googletagmanager\.com,doubleclick\.net,connect\.facebook\.net,'
+    r'facebook\.com/tr[/?],/ajax/bz,/ajax/qm/,/logging/'
+).split(',') if p.strip()]
+
+# Довгоживучий браузер: перестворення контекстів після N сторінок або при перевищенні пам'яті
+BROWSER_CONTEXT_MAX_PAGES = int(os.getenv('BROWSER_CONTEXT_MAX_PAGES', 25))
+BROWSER_MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', 1500))
+# Пам'ять браузера перевіряється раз на N звільнених сторінок
+BROWSER_RSS_CHECK_EVERY = int(os.getenv('BROWSER_RSS_CHECK_EVERY', 5))
+
+# Ліміти надсилання в Telegram (повідомлень за секунду)
+TG_GLOBAL_RATE = float(os.getenv('TG_GLOBAL_RATE', 25))
+TG_CHAT_RATE = float(os.getenv('TG_CHAT_RATE', 1))
+TG_GROUP_CHAT_RATE = float(os.getenv('TG_GROUP_CHAT_RATE', 20 / 60))
+TG_CHAT_BURST = int(os.getenv('TG_CHAT_BURST', 3))
+
+# Кеш готових звітів
+REPORT_CACHE_SIZE = int(os.getenv('REPORT_CACHE_SIZE', 64))
+REPORT_CACHE_TTL = int(os.getenv('REPORT_CACHE_TTL', 3600))
+
+# Адаптивний розклад скрапінгу по кожному бізнесу (хвилини)
+SCHEDULE_MIN_INTERVAL = int(os.getenv('SCHEDULE_MIN_INTERVAL', 30))
+SCHEDULE_MAX_INTERVAL = int(os.getenv('SCHEDULE_MAX_INTERVAL', 24 * 60))
+SCHEDULE_DEFAULT_INTERVAL = int(os.getenv('SCHEDULE_DEFAULT_INTERVAL', 60))
+SCHEDULE_JITTER = float(os.getenv('SCHEDULE_JITTER', 0.1))
+SCHEDULER_TICK_SECONDS = int(os.getenv('SCHEDULER_TICK_SECONDS', 60))
+
+# Черга задач скрапінгу в базі даних
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 300))
+JOB_HEARTBEAT_SECONDS = int(os.getenv('JOB_HEARTBEAT_SECONDS', 60))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+WORKER_POLL_SECONDS = float(os.getenv('WORKER_POLL_SECONDS', 5))
+# Запускати воркер у процесі бота (один контейнер) чи лише ставити задачі в чергу для worker.py
+RUN_EMBEDDED_WORKER = os.getenv('RUN_EMBEDDED_WORKER', 'true').lower() in ('1', 'true', 'yes')
+# Як часто редагувати повідомлення з прогресом /scrape (Telegram обмежує частоту редагувань)
+SCRAPE_PROGRESS_EDIT_SECONDS = float(os.getenv('SCRAPE_PROGRESS_EDIT_SECONDS', 5))
+
+# Очищення: неактивні оголошення старші за N днів видаляються пачками разом з файлами, якими вони володіли
+RETENTION_DAYS = int(os.getenv('RETENTION_DAYS', 30))
+CLEANUP_BATCH_SIZE = int(os.getenv('CLEANUP_BATCH_SIZE', 500))
+CLEANUP_INTERVAL_SECONDS = int(os.getenv('CLEANUP_INTERVAL_SECONDS', 24 * 60 * 60))
+# Файли, молодші за цей вік, не вважаються сиротами: їхній рядок у базі може бути ще не закомічено
+ORPHAN_MIN_AGE_SECONDS = int(os.getenv('ORPHAN_MIN_AGE_SECONDS', 60 * 60))
+
+# Порт /metrics окремого воркера (worker.py); 0 — не запускати
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', 0))
+
+# Варіанти зображень при завантаженні: стиснена копія для звітів і мініатюра
+IMAGE_REPORT_MAX_SIDE = int(os.getenv('IMAGE_REPORT_MAX_SIDE', 1280))  # Telegram все одно стискає фото до 1280
+IMAGE_REPORT_QUALITY = int(os.getenv('IMAGE_REPORT_QUALITY', 82))
+IMAGE_THUMB_SIDE = int(os.getenv('IMAGE_THUMB_SIDE', 160))
+IMAGE_THUMB_QUALITY = int(os.getenv('IMAGE_THUMB_QUALITY', 70))
+# Зберігати ще й оригінал у тому вигляді, як його віддав Facebook
+KEEP_ORIGINAL_IMAGES = os.getenv('KEEP_ORIGINAL_IMAGES', 'false').lower() in ('1', 'true', 'yes')
+
+# Повний звіт (/reportall) надсилається сторінками з кнопкою "далі"
+REPORT_PAGE_SIZE = int(os.getenv('REPORT_PAGE_SIZE', 30))
+# Скільки рядків серверний курсор віддає за раз
+REPORT_STREAM_CHUNK = int(os.getenv('REPORT_STREAM_CHUNK', 50))
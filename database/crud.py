@@ -1,4 +1,12 @@
-from models import Session, Business
+from datetime import date
+
+from sqlalchemy import select, update, delete, func, exists, and_
+from sqlalchemy.dialects.postgresql import insert
+
+from database.models import Session, Business, AdCreative, ImageBlob, ImageUrl, CreativeCluster, DataGeneration
+
+# Обмеження кількості рядків в одному INSERT, щоб не впертися в ліміт параметрів PostgreSQL
+UPSERT_CHUNK_SIZE = 1000
 
 
 def get_all_businesses():
@@ -24,3 +32,181 @@ def add_business(name, fb_page_id):
         return None
     finally:
         session.close()
+
+
+async def get_known_ad_ids(session, ad_ids) -> set[str]:
+    """Одним запитом з IN повертає ті з `ad_ids`, що вже є в базі."""
+    if not ad_ids:
+        return set()
+    rows = await session.execute(select(AdCreative.fb_ad_id).where(AdCreative.fb_ad_id.in_(list(ad_ids))))
+    return set(rows.scalars())
+
+
+async def upsert_ads(session, rows: list[dict]):
+    """
+    Пакетний INSERT ... ON CONFLICT (fb_ad_id) DO UPDATE.
+    Нові оголошення вставляються повністю, у вже відомих оновлюються лише
+    last_seen, is_active та тривалість (від збереженої дати старту).
+    """
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(AdCreative).values(rows[i:i + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AdCreative.fb_ad_id],
+            set_={
+                'last_seen': stmt.excluded.last_seen,
+                'is_active': True,
+                'duration_days': stmt.excluded.last_seen - AdCreative.start_date + 1,
+            },
+        )
+        await session.execute(stmt)
+
+
+async def deactivate_missing_ads(session, business_id: int, seen_ad_ids, today: date) -> list[str]:
+    """Одним UPDATE деактивує активні оголошення бізнесу, яких немає серед `seen_ad_ids`."""
+    stmt = (
+        update(AdCreative)
+        .where(
+            AdCreative.business_id == business_id,
+            AdCreative.is_active == True,
+            AdCreative.fb_ad_id.not_in(list(seen_ad_ids)),
+        )
+        .values(is_active=False, end_date=today)
+        .returning(AdCreative.fb_ad_id)
+        .execution_options(synchronize_session=False)
+    )
+    return list((await session.execute(stmt)).scalars())
+
+
+async def get_blobs_by_url(session, url_keys) -> dict[str, ImageBlob]:
+    """Блоби, на які вже вказують ці ключі URL."""
+    if not url_keys:
+        return {}
+    rows = await session.execute(
+        select(ImageUrl.url_key, ImageBlob).join(ImageBlob, ImageBlob.digest == ImageUrl.digest)
+        .where(ImageUrl.url_key.in_(list(url_keys)))
+    )
+    return {url_key: blob for url_key, blob in rows}
+
+
+async def get_blobs(session, digests) -> dict[str, ImageBlob]:
+    if not digests:
+        return {}
+    rows = await session.execute(select(ImageBlob).where(ImageBlob.digest.in_(list(digests))))
+    return {blob.digest: blob for blob in rows.scalars()}
+
+
+async def insert_blobs(session, rows: list[dict]):
+    if rows:
+        await session.execute(insert(ImageBlob).values(rows).on_conflict_do_nothing(index_elements=[ImageBlob.digest]))
+
+
+async def link_urls(session, url_digests: dict[str, str]):
+    if url_digests:
+        stmt = insert(ImageUrl).values([{'url_key': key, 'digest': digest} for key, digest in url_digests.items()])
+        await session.execute(stmt.on_conflict_do_update(index_elements=[ImageUrl.url_key],
+                                                         set_={'digest': stmt.excluded.digest}))
+
+
+async def refresh_ref_counts(session, digests):
+    """Перераховує кількість оголошень, що посилаються на кожен з блобів, одним UPDATE."""
+    if not digests:
+        return
+    references = (
+        select(func.count(AdCreative.id))
+        .where(AdCreative.image_digest == ImageBlob.digest)
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(ImageBlob).where(ImageBlob.digest.in_(list(digests))).values(ref_count=references)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def select_expired_ads(session, cutoff: date, limit: int):
+    """
+    Пачка неактивних оголошень, яких не бачили з `cutoff`: [(id, image_digest, local_path, cluster_id)].
+    SKIP LOCKED — щоб очищення не чекало на рядки, які зараз оновлює скрапер.
+    """
+    rows = await session.execute(
+        select(AdCreative.id, AdCreative.image_digest, AdCreative.local_path, AdCreative.cluster_id)
+        .where(~AdCreative.is_active, AdCreative.last_seen < cutoff)
+        .order_by(AdCreative.last_seen, AdCreative.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return rows.all()
+
+
+async def delete_ads(session, ad_ids):
+    if ad_ids:
+        await session.execute(delete(AdCreative).where(AdCreative.id.in_(list(ad_ids))))
+
+
+async def delete_unreferenced_blobs(session, digests) -> list:
+    """
+    Видаляє блоби (і кеш їхніх URL), на які більше не посилається жодне оголошення.
+    Повертає [(digest, local_path, thumb_path, original_path)] видалених — файли прибирає викликач після коміту.
+    """
+    if not digests:
+        return []
+    unreferenced = and_(
+        ImageBlob.digest.in_(list(digests)),
+        ImageBlob.ref_count == 0,
+        ~exists().where(AdCreative.image_digest == ImageBlob.digest),
+    )
+    orphaned = select(ImageBlob.digest).where(unreferenced).scalar_subquery()
+    await session.execute(delete(ImageUrl).where(ImageUrl.digest.in_(orphaned)))
+    rows = await session.execute(
+        delete(ImageBlob).where(unreferenced)
+        .returning(ImageBlob.digest, ImageBlob.local_path, ImageBlob.thumb_path, ImageBlob.original_path)
+    )
+    return rows.all()
+
+
+async def lock_clusters(session, cluster_ids) -> set[int]:
+    """
+    FOR KEY SHARE на кластери, на які посилатимуться оголошення цієї транзакції: очищення
+    не видалить їх до коміту. Повертає id кластерів, які ще існують.
+    """
+    if not cluster_ids:
+        return set()
+    rows = await session.execute(
+        select(CreativeCluster.id).where(CreativeCluster.id.in_(list(cluster_ids)))
+        .with_for_update(read=True, key_share=True)
+    )
+    return set(rows.scalars())
+
+
+async def delete_empty_clusters(session, cluster_ids) -> int:
+    """
+    Видаляє кластери з `cluster_ids`, у яких не лишилось жодного оголошення.
+    Кластери, які зараз блокує збереження скрапера (lock_clusters), пропускаються.
+    """
+    if not cluster_ids:
+        return 0
+    empty = (
+        select(CreativeCluster.id)
+        .where(CreativeCluster.id.in_(list(cluster_ids)), ~exists().where(AdCreative.cluster_id == CreativeCluster.id))
+        .with_for_update(skip_locked=True)
+    )
+    result = await session.execute(delete(CreativeCluster).where(CreativeCluster.id.in_(empty)))
+    return result.rowcount
+
+
+async def existing_blob_digests(session, digests) -> set[str]:
+    if not digests:
+        return set()
+    rows = await session.execute(select(ImageBlob.digest).where(ImageBlob.digest.in_(list(digests))))
+    return set(rows.scalars())
+
+
+async def bump_data_generation(session):
+    """Робить закешовані звіти застарілими. Викликається в транзакції, що змінює дані звітів."""
+    await session.execute(
+        update(DataGeneration).where(DataGeneration.id == 1)
+        .values(value=DataGeneration.value + 1, updated_at=func.now())
+    )
+
+
+async def get_data_generation(session) -> int | None:
+    return await session.scalar(select(DataGeneration.value).where(DataGeneration.id == 1))
@@ -0,0 +1,124 @@
+"""
+Версійовані міграції схеми замість голого Base.metadata.create_all.
+
+Номер застосованої версії зберігається в schema_version. Кожна міграція виконується в окремій
+транзакції під advisory lock, тож бот і воркери, що стартують одночасно, не застосують її двічі.
+Міграції пишуться ідемпотентно (IF NOT EXISTS): база, створена ще через create_all,
+проходить їх без помилок.
+
+    python -m database.migrations          # застосувати нові міграції
+"""
+import logging
+
+from sqlalchemy import text
+
+from database.models import Base, engine
+
+logger = logging.getLogger(__name__)
+
+# Довільна константа для pg_advisory_xact_lock, спільна для всіх процесів
+MIGRATION_LOCK_ID = 7_240_911
+
+
+def _baseline(conn):
+    """Таблиці, яких ще немає. Наявні таблиці create_all не чіпає — колонки додають наступні міграції."""
+    Base.metadata.create_all(conn)
+
+
+def _columns_since_create_all(conn):
+    """
+    Колонки, додані до таблиць першого деплою (businesses, ad_creatives): create_all не змінює наявні таблиці.
+    Решту таблиць створює baseline одразу з усіма колонками.
+    """
+    conn.execute(text("""
+        ALTER TABLE businesses
+            ADD COLUMN IF NOT EXISTS scrape_interval_minutes INTEGER,
+            ADD COLUMN IF NOT EXISTS next_scrape_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS last_scraped_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS last_churn INTEGER;
+        CREATE INDEX IF NOT EXISTS ix_businesses_next_scrape_at ON businesses (next_scrape_at);
+
+        ALTER TABLE ad_creatives
+            ADD COLUMN IF NOT EXISTS image_digest VARCHAR(64) REFERENCES image_blobs (digest),
+            ADD COLUMN IF NOT EXISTS cluster_id INTEGER REFERENCES creative_clusters (id);
+        CREATE INDEX IF NOT EXISTS ix_ad_creatives_image_digest ON ad_creatives (image_digest);
+        CREATE INDEX IF NOT EXISTS ix_ad_creatives_cluster_id ON ad_creatives (cluster_id);
+    """))
+
+
+def _report_indexes(conn):
+    """
+    Індекси під фільтри звітів. Порядок start_date DESC NULLS LAST, id DESC збігається з курсором
+    повного звіту, де креативи без дати старту йдуть наприкінці бізнесу.
+    """
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_ad_creatives_business_start
+            ON ad_creatives (business_id, start_date DESC NULLS LAST, id DESC);
+        CREATE INDEX IF NOT EXISTS ix_ad_creatives_active_business_start
+            ON ad_creatives (business_id, start_date DESC NULLS LAST, id DESC) WHERE is_active;
+        CREATE INDEX IF NOT EXISTS ix_ad_creatives_active_start
+            ON ad_creatives (start_date DESC) WHERE is_active;
+        CREATE INDEX IF NOT EXISTS ix_ad_creatives_inactive_last_seen
+            ON ad_creatives (last_seen, id) WHERE NOT is_active;
+    """))
+    conn.execute(text("ANALYZE ad_creatives"))
+
+
+def _data_generation_row(conn):
+    """Єдиний рядок лічильника покоління даних для кешу звітів; саму таблицю створює baseline."""
+    conn.execute(text(
+        "INSERT INTO data_generation (id, value, updated_at) VALUES (1, 0, now()) ON CONFLICT (id) DO NOTHING"
+    ))
+
+
+# (версія, опис, функція). Нові міграції лише дописуються в кінець
+MIGRATIONS = [
+    (1, 'baseline: create missing tables', _baseline),
+    (2, 'columns added after create_all', _columns_since_create_all),
+    (3, 'report indexes', _report_indexes),
+    (4, 'report cache data generation row', _data_generation_row),
+]
+
+
+def current_version(conn) -> int:
+    return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+
+def run_migrations(target: int | None = None):
+    """Застосовує всі міграції, новіші за версію в schema_version (або до `target`)."""
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description VARCHAR NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """))
+
+    applied = 0
+    for version, description, migrate in MIGRATIONS:
+        if target is not None and version > target:
+            break
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:lock_id)"), {'lock_id': MIGRATION_LOCK_ID})
+            # Побудова індексів і заповнення колонок на великій таблиці довші за звичайний ліміт запиту
+            conn.execute(text("SET LOCAL statement_timeout = 0"))
+            # Версію перевіряємо вже під замком: інший процес міг застосувати її, поки ми чекали
+            if version <= current_version(conn):
+                continue
+            logger.info(f"Застосовую міграцію {version}: {description}...")
+            migrate(conn)
+            conn.execute(text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                         {'version': version, 'description': description})
+            applied += 1
+
+    with engine.connect() as conn:
+        version = current_version(conn)
+    logger.info(f"Схема бази актуальна: версія {version}" + (f" (застосовано {applied})." if applied else "."))
+    return version
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    run_migrations()
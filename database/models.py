@@ -1,7 +1,16 @@
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, create_engine
+import logging
+from datetime import datetime
+
+from sqlalchemy import (Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Index, create_engine,
+                        make_url)
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import relationship, sessionmaker, declarative_base
 
-from config import POSTGRESQl_LINK
+from config import (POSTGRESQl_LINK, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+                    DB_STATEMENT_TIMEOUT_MS, DB_SYNC_POOL_SIZE, DB_SYNC_MAX_OVERFLOW)
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -10,6 +19,11 @@ class Business(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     fb_page_id = Column(String, unique=True)
+    # Адаптивний розклад: інтервал підлаштовується під кількість змін за скрапінг
+    scrape_interval_minutes = Column(Integer, nullable=True)
+    next_scrape_at = Column(DateTime, nullable=True, index=True)
+    last_scraped_at = Column(DateTime, nullable=True)
+    last_churn = Column(Integer, nullable=True)
 
 class AdCreative(Base):
     __tablename__ = 'ad_creatives'
@@ -18,7 +32,9 @@ class AdCreative(Base):
     business_id = Column(Integer, ForeignKey('businesses.id'))
     image_url = Column(String)
     local_path = Column(String)
+    image_digest = Column(String(64), ForeignKey('image_blobs.digest'), nullable=True, index=True)
     image_hash = Column(String, index=True, nullable=True)
+    cluster_id = Column(Integer, ForeignKey('creative_clusters.id'), nullable=True, index=True)
     similar_ads_count = Column(Integer, default=0, index=True)
     start_date = Column(Date)
     end_date = Column(Date, nullable=True)
@@ -28,9 +44,152 @@ class AdCreative(Base):
 
 
     business = relationship('Business')
+    image_blob = relationship('ImageBlob')
+
+
+# Індекси під звіти: фільтр за бізнесом і активністю, сортування start_date DESC NULLS LAST, id DESC
+# (той самий порядок, що й у курсора пагінації повного звіту)
+Index('ix_ad_creatives_business_start', AdCreative.business_id, AdCreative.start_date.desc().nulls_last(),
+      AdCreative.id.desc())
+Index('ix_ad_creatives_active_business_start', AdCreative.business_id, AdCreative.start_date.desc().nulls_last(),
+      AdCreative.id.desc(), postgresql_where=AdCreative.is_active)
+# Звіти "по всіх бізнесах" за період: діапазон start_date лише серед активних
+Index('ix_ad_creatives_active_start', AdCreative.start_date.desc(), postgresql_where=AdCreative.is_active)
+# Очищення за ретеншном шукає давно неактивні оголошення
+Index('ix_ad_creatives_inactive_last_seen', AdCreative.last_seen, AdCreative.id, postgresql_where=~AdCreative.is_active)
+
+class ImageBlob(Base):
+    """Зображення у сховищі, адресованому за вмістом: один файл на унікальні байти."""
+    __tablename__ = 'image_blobs'
+    digest = Column(String(64), primary_key=True)  # sha256 вмісту
+    local_path = Column(String)  # копія для звітів (до появи варіантів — оригінал)
+    thumb_path = Column(String, nullable=True)
+    original_path = Column(String, nullable=True)  # лише з KEEP_ORIGINAL_IMAGES
+    size_bytes = Column(Integer)  # розмір завантаженого оригіналу
+    stored_bytes = Column(Integer, nullable=True)  # усі файли блобу на диску
+    image_hash = Column(String, nullable=True)
+    ref_count = Column(Integer, default=0, index=True)
+    tg_file_id = Column(String, nullable=True)  # file_id з першого надсилання в Telegram
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class CreativeCluster(Base):
+    """Група схожих креативів: pHash представника в межах порогу Хеммінга від усіх учасників."""
+    __tablename__ = 'creative_clusters'
+    id = Column(Integer, primary_key=True)
+    representative_hash = Column(String)
+    representative_phash = Column(BigInteger, nullable=True)
+    representative_fb_ad_id = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ScrapeRun(Base):
+    """Ручний запуск /scrape: група задач і повідомлення, в якому показується прогрес."""
+    __tablename__ = 'scrape_runs'
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(BigInteger, nullable=True)
+    message_id = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    jobs = relationship('ScrapeJob', back_populates='run')
+
+class ScrapeJob(Base):
+    """Задача скрапінгу одного бізнесу. Воркер бере її з оренди (lease), яку продовжує heartbeat."""
+    __tablename__ = 'scrape_jobs'
+    id = Column(Integer, primary_key=True)
+    business_id = Column(Integer, ForeignKey('businesses.id', ondelete='CASCADE'), index=True)
+    run_id = Column(Integer, ForeignKey('scrape_runs.id', ondelete='SET NULL'), nullable=True, index=True)
+    status = Column(String(16), default='pending', index=True)  # pending / running / done / failed
+    attempts = Column(Integer, default=0)
+    enqueued_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    new_ads = Column(Integer, nullable=True)
+    updated_ads = Column(Integer, nullable=True)
+    deactivated_ads = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+
+    business = relationship('Business')
+    run = relationship('ScrapeRun', back_populates='jobs')
+
+    # Не більше однієї активної задачі на бізнес, навіть якщо планувальник і /scrape ставлять її одночасно
+    __table_args__ = (
+        Index('uq_scrape_jobs_active_business', 'business_id', unique=True,
+              postgresql_where=status.in_(('pending', 'running'))),
+    )
+
+class DataGeneration(Base):
+    """
+    Покоління даних для кешу звітів (один рядок). Збільшується в тій самій транзакції,
+    що змінює оголошення чи видаляє їхні файли, тож кеш кожного процесу бачить зміну разом з даними.
+    """
+    __tablename__ = 'data_generation'
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ImageUrl(Base):
+    """Кеш URL креативу -> блоб, щоб не завантажувати один і той самий файл з CDN повторно."""
+    __tablename__ = 'image_urls'
+    url_key = Column(String, primary_key=True)
+    digest = Column(String(64), ForeignKey('image_blobs.digest', ondelete='CASCADE'), index=True)
 
 
 DATABASE_URL = POSTGRESQl_LINK
 
-engine = create_engine(DATABASE_URL)
+# Параметри libpq, яких немає серед аргументів asyncpg.connect; sslmode і connect_timeout перекладаються окремо
+LIBPQ_ONLY_PARAMS = {'sslrootcert', 'sslcert', 'sslkey', 'sslcrl', 'sslpassword', 'sslcompression', 'gssencmode',
+                     'channel_binding', 'target_session_attrs', 'keepalives', 'keepalives_idle',
+                     'keepalives_interval', 'keepalives_count', 'options', 'client_encoding'}
+
+
+def to_async_url(url: str) -> tuple[URL, dict]:
+    """
+    postgres://... або postgresql://... -> postgresql+asyncpg://... і аргументи підключення для asyncpg.
+    Параметри запиту libpq asyncpg не розуміє: sslmode стає аргументом ssl,
+    connect_timeout — timeout, application_name — налаштуванням сервера, решта відкидається.
+    """
+    scheme, _, rest = url.partition('://')
+    if scheme in ('postgres', 'postgresql', 'postgresql+psycopg2'):
+        scheme = 'postgresql+asyncpg'
+    parsed = make_url(f'{scheme}://{rest}')
+    query = dict(parsed.query)
+    connect_args = {}
+    if 'sslmode' in query:
+        connect_args['ssl'] = query.pop('sslmode')
+    if 'connect_timeout' in query:
+        connect_args['timeout'] = float(query.pop('connect_timeout'))
+    if 'application_name' in query:
+        connect_args['server_settings'] = {'application_name': query.pop('application_name')}
+    for name in LIBPQ_ONLY_PARAMS & query.keys():
+        logger.warning(f"Параметр підключення '{name}' не підтримується asyncpg і буде пропущений.")
+        del query[name]
+    return parsed.set(query=query), connect_args
+
+
+# Синхронний рушій лишився лише для міграцій і скриптів, тож йому вистачає маленького пулу
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'},
+    pool_size=DB_SYNC_POOL_SIZE,
+    max_overflow=DB_SYNC_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
 Session = sessionmaker(bind=engine)
+
+# Асинхронний рушій для обробників бота і скрапера: запити не блокують цикл подій
+ASYNC_URL, ASYNC_CONNECT_ARGS = to_async_url(DATABASE_URL)
+ASYNC_CONNECT_ARGS.setdefault('server_settings', {})['statement_timeout'] = str(DB_STATEMENT_TIMEOUT_MS)
+async_engine = create_async_engine(
+    ASYNC_URL,
+    connect_args=ASYNC_CONNECT_ARGS,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=True,
+)
+AsyncSession = async_sessionmaker(bind=async_engine, expire_on_commit=False)
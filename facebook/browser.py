@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from playwright.async_api import async_playwright
+
+from config import BROWSER_CONTEXT_MAX_PAGES, BROWSER_MAX_RSS_MB, BROWSER_RSS_CHECK_EVERY
+from facebook.routing import RoutingPolicy
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_OPTIONS = dict(
+    locale='uk-UA',
+    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0"
+)
+
+
+def _children_by_parent() -> dict[int, list[int]]:
+    children = {}
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = Path(entry.path, 'stat').read_text()
+        except OSError:
+            continue
+        # Поле comm може містити пробіли, тому ppid шукаємо після останньої дужки
+        ppid = int(stat.rsplit(')', 1)[1].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+    return children
+
+
+def _process_memory_kb(pid: int) -> int:
+    """
+    PSS процесу: спільні сторінки Chromium діляться між процесами, що їх використовують,
+    тож сума по дереву не рахує їх двічі. Без smaps_rollup — RSS мінус спільні сторінки.
+    """
+    try:
+        for line in Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines():
+            if line.startswith('Pss:'):
+                return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    try:
+        _, resident, shared = Path(f'/proc/{pid}/statm').read_text().split()[:3]
+        return (int(resident) - int(shared)) * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+def playwright_driver_pids() -> list[int]:
+    """Дочірні процеси бота, що є драйвером Playwright; Chromium — їхні нащадки."""
+    pids = []
+    try:
+        for pid in _children_by_parent().get(os.getpid(), []):
+            try:
+                cmdline = Path(f'/proc/{pid}/cmdline').read_bytes()
+            except OSError:
+                continue
+            if b'playwright' in cmdline:
+                pids.append(pid)
+    except OSError:
+        pass
+    return pids
+
+
+def process_tree_rss_mb(root_pids: list[int]) -> float:
+    """
+    Сумарна пам'ять (PSS) процесів `root_pids` і всіх їхніх нащадків. Працює лише на Linux.
+    Корінь — драйвер Playwright, а не бот, тож воркери пулу хешування сюди не потрапляють.
+    """
+    if not root_pids:
+        return 0.0
+    try:
+        children = _children_by_parent()
+    except OSError:
+        return 0.0
+
+    total_kb = 0
+    stack = list(root_pids)
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        total_kb += _process_memory_kb(pid)
+    return total_kb / 1024
+
+
+class BrowserManager:
+    """
+    Один браузер на весь час роботи бота. Видає сторінки з пулу контекстів,
+    перевіряє з'єднання з браузером і перестворює контексти після
+    `max_pages` сторінок або коли пам'ять браузера перевищує `max_rss_mb`.
+    Пам'ять перевіряється раз на `rss_check_every` звільнених сторінок в окремому потоці.
+    """
+
+    def __init__(self, max_pages: int = BROWSER_CONTEXT_MAX_PAGES, max_rss_mb: int = BROWSER_MAX_RSS_MB,
+                 rss_check_every: int = BROWSER_RSS_CHECK_EVERY):
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.rss_check_every = max(1, rss_check_every)
+        self.routing = RoutingPolicy()
+        self._playwright = None
+        self._browser = None
+        self._idle = []  # [(context, pages_served)]
+        self._leased = 0
+        self._releases = 0
+        self._driver_pids = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        async with self._lock:
+            await self._launch()
+
+    async def _launch(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+            self._driver_pids = await asyncio.to_thread(playwright_driver_pids)
+        self._browser = await self._playwright.chromium.launch(headless=True)
+        self._idle = []
+        logger.info("🌐 Браузер Playwright запущено.")
+
+    async def stop(self):
+        async with self._lock:
+            if self._browser:
+                await self._browser.close()
+                self._browser = None
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+            self._idle = []
+            self._driver_pids = []
+            logger.info("Браузер Playwright закрито.")
+
+    async def _ensure_healthy(self):
+        if self._browser is None or not self._browser.is_connected():
+            logger.warning("⚠️ Браузер недоступний, перезапускаю...")
+            if self._browser:
+                try:
+                    await self._browser.close()
+                except Exception:
+                    pass
+            await self._launch()
+
+    async def _acquire_context(self):
+        async with self._lock:
+            await self._ensure_healthy()
+            self._leased += 1
+            if self._idle:
+                return self._idle.pop()
+            context = await self._browser.new_context(**CONTEXT_OPTIONS)
+            await self.routing.install(context)
+            return context, 0
+
+    async def _browser_rss_mb(self) -> float:
+        return await asyncio.to_thread(process_tree_rss_mb, self._driver_pids)
+
+    async def _release_context(self, context, pages_served: int, broken: bool):
+        self._releases += 1
+        over_memory = False
+        if self._releases % self.rss_check_every == 0:
+            over_memory = await self._browser_rss_mb() > self.max_rss_mb
+
+        async with self._lock:
+            self._leased -= 1
+            if broken or over_memory or pages_served >= self.max_pages:
+                await self._close_quietly(context)
+            else:
+                self._idle.append((context, pages_served))
+
+            if over_memory:
+                logger.warning(f"⚠️ Пам'ять браузера перевищила {self.max_rss_mb} МБ, звільняю контексти.")
+                for idle_context, _ in self._idle:
+                    await self._close_quietly(idle_context)
+                self._idle = []
+                # Якщо й без контекстів пам'ять не повернулась — перезапускаємо браузер, коли він вільний
+                if self._leased == 0 and await self._browser_rss_mb() > self.max_rss_mb:
+                    await self._browser.close()
+                    await self._launch()
+
+    @staticmethod
+    async def _close_quietly(context):
+        try:
+            await context.close()
+        except Exception:
+            pass
+
+    @asynccontextmanager
+    async def page(self):
+        """Видає нову сторінку в одному з теплих контекстів; після використання сторінка закривається."""
+        if not self.started:
+            await self.start()
+        context, pages_served = await self._acquire_context()
+        broken = False
+        page = None
+        try:
+            page = await context.new_page()
+            yield page
+        except Exception:
+            broken = True
+            raise
+        finally:
+            if page:
+                try:
+                    await page.close()
+                except Exception:
+                    broken = True
+            await self._release_context(context, pages_served + 1, broken)
+
+
+browser_manager = BrowserManager()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+
+from sqlalchemy import select, update
+
+from database.crud import lock_clusters
+from database.models import AsyncSession, AdCreative, CreativeCluster
+from facebook.hashing import phash_files, get_executor, shutdown_executor
+from facebook.similarity import HashIndex, hash_to_int, hash_to_signed, signed_to_int, HAMMING_DISTANCE_THRESHOLD
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+class ClusterIndex:
+    """
+    Індекс представників кластерів у пам'яті процесу.
+    Новий креатив потрапляє в перший за часом створення кластер у межах порогу,
+    інакше стає представником нового кластера. Перед кожним призначенням індекс
+    догружає кластери, створені іншими процесами; про кластери, видалені очищенням,
+    він дізнається в assign_locked і тоді перечитується повністю.
+    """
+
+    def __init__(self, threshold: int = HAMMING_DISTANCE_THRESHOLD):
+        self.threshold = threshold
+        self._lock = asyncio.Lock()
+        self.invalidate()
+
+    def __len__(self):
+        return len(self._cluster_ids)
+
+    def invalidate(self):
+        self._index = HashIndex()
+        self._cluster_ids = []
+        self._max_id = 0
+
+    def _add(self, cluster_id: int, value: int):
+        self._index.add(value)
+        self._cluster_ids.append(cluster_id)
+        self._max_id = max(self._max_id, cluster_id)
+
+    async def _sync(self, session):
+        rows = await session.execute(
+            select(CreativeCluster.id, CreativeCluster.representative_phash, CreativeCluster.representative_hash)
+            .where(CreativeCluster.id > self._max_id)
+            .order_by(CreativeCluster.id)
+        )
+        # Ціле з BIGINT не треба розбирати; hex лишається запасним варіантом для старих рядків
+        for cluster_id, phash, image_hash in rows:
+            self._add(cluster_id, signed_to_int(phash) if phash is not None else hash_to_int(image_hash))
+
+    async def assign(self, hashes: list[tuple[str, str]]) -> dict[str, int]:
+        """
+        Призначає кластер кожній парі (fb_ad_id, hex pHash); повертає {fb_ad_id: cluster_id}.
+        Нові кластери комітяться одразу в окремій сесії, щоб на них могли посилатися
+        транзакції інших воркерів.
+        """
+        assignment = {}
+        async with self._lock, AsyncSession() as session:
+            await self._sync(session)
+            for fb_ad_id, image_hash in hashes:
+                try:
+                    value = hash_to_int(image_hash)
+                except (TypeError, ValueError):
+                    logger.error(f"    - Некоректний хеш '{image_hash}' для {fb_ad_id}, кластер не призначено.")
+                    continue
+
+                position = self._index.first_within(value, self.threshold)
+                if position is not None:
+                    assignment[fb_ad_id] = self._cluster_ids[position]
+                    continue
+
+                cluster = CreativeCluster(representative_hash=image_hash, representative_phash=hash_to_signed(image_hash),
+                                          representative_fb_ad_id=fb_ad_id)
+                session.add(cluster)
+                await session.flush()
+                self._add(cluster.id, value)
+                assignment[fb_ad_id] = cluster.id
+            await session.commit()
+        return assignment
+
+
+    async def assign_locked(self, session, hashes: list[tuple[str, str]]) -> dict[str, int]:
+        """
+        Як assign, але ще й блокує призначені кластери в транзакції `session` (FOR KEY SHARE), тож
+        очищення не видалить їх, доки оголошення з цими cluster_id не закомічено. Якщо кластер
+        уже видалено, індекс перечитується з бази і такі креативи призначаються заново.
+        """
+        assignment = await self.assign(hashes)
+        existing = await lock_clusters(session, set(assignment.values()))
+        missing = {fb_ad_id for fb_ad_id, cluster_id in assignment.items() if cluster_id not in existing}
+        if missing:
+            logger.info(f"    - Кластери {len(missing)} креативів видалено очищенням, перечитую індекс.")
+            async with self._lock:
+                self.invalidate()
+            retry = await self.assign([item for item in hashes if item[0] in missing])
+            existing |= await lock_clusters(session, set(retry.values()))
+            assignment.update(retry)
+        return {fb_ad_id: cluster_id for fb_ad_id, cluster_id in assignment.items() if cluster_id in existing}
+
+
+cluster_index = ClusterIndex()
+
+
+async def rehash_legacy_ads(batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Оголошення, збережені до сховища за вмістом, мають pHash з повного декодування, а нові —
+    зі зменшеного (phash_bytes), і вони розходяться до 2 біт. Перераховує такі хеші з local_path
+    тим самим способом, що й скрапінг, разом з представниками їхніх кластерів. Повертає кількість змінених.
+    """
+    loop = asyncio.get_running_loop()
+    last_id = 0
+    total = 0
+    while True:
+        async with AsyncSession() as session:
+            rows = (await session.execute(
+                select(AdCreative.id, AdCreative.fb_ad_id, AdCreative.image_hash, AdCreative.local_path)
+                .where(AdCreative.id > last_id, AdCreative.image_digest.is_(None),
+                       AdCreative.image_hash.isnot(None), AdCreative.local_path.isnot(None))
+                .order_by(AdCreative.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            hashes = await loop.run_in_executor(get_executor(), phash_files, [row.local_path for row in rows])
+            changed = {row.fb_ad_id: (row.id, image_hash) for row, image_hash in zip(rows, hashes)
+                       if image_hash and image_hash != row.image_hash}
+            if changed:
+                await session.execute(update(AdCreative), [
+                    {'id': ad_id, 'image_hash': image_hash} for ad_id, image_hash in changed.values()
+                ])
+                clusters = (await session.execute(
+                    select(CreativeCluster.id, CreativeCluster.representative_fb_ad_id)
+                    .where(CreativeCluster.representative_fb_ad_id.in_(list(changed)))
+                )).all()
+                if clusters:
+                    await session.execute(update(CreativeCluster), [
+                        {'id': cluster_id, 'representative_hash': changed[fb_ad_id][1],
+                         'representative_phash': hash_to_signed(changed[fb_ad_id][1])}
+                        for cluster_id, fb_ad_id in clusters
+                    ])
+            await session.commit()
+            total += len(changed)
+    return total
+
+
+async def backfill_clusters(batch_size: int = BACKFILL_BATCH_SIZE):
+    """
+    Разово розкладає по кластерах наявні креативи з хешем, але без cluster_id.
+    Спершу перераховує хеші старих оголошень, щоб індекс порівнював хеші одного декодування.
+    """
+    try:
+        rehashed = await rehash_legacy_ads(batch_size)
+    finally:
+        shutdown_executor()
+    logger.info(f"Перераховано pHash старих оголошень: {rehashed}.")
+    last_id = 0
+    total = 0
+    while True:
+        async with AsyncSession() as session:
+            rows = (await session.execute(
+                select(AdCreative.id, AdCreative.fb_ad_id, AdCreative.image_hash)
+                .where(AdCreative.id > last_id, AdCreative.cluster_id.is_(None), AdCreative.image_hash.isnot(None))
+                .order_by(AdCreative.id)
+                .limit(batch_size)
+            )).all()
+            if not rows:
+                break
+
+            assignment = await cluster_index.assign_locked(session, [(row.fb_ad_id, row.image_hash) for row in rows])
+            updates = [{'id': row.id, 'cluster_id': assignment[row.fb_ad_id]} for row in rows if row.fb_ad_id in assignment]
+            if updates:
+                await session.execute(update(AdCreative), updates)
+            await session.commit()
+            last_id = rows[-1].id
+            total += len(updates)
+            logger.info(f"Кластеризовано {total} креативів...")
+    logger.info(f"✅ Backfill завершено: {total} креативів, кластерів у індексі: {len(cluster_index)}.")
+
+
+if __name__ == '__main__':
+    asyncio.run(backfill_clusters())
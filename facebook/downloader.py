@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import random
+
+import aiohttp
+
+from config import DOWNLOAD_MAX_CONNECTIONS, DOWNLOAD_PER_HOST_LIMIT, DOWNLOAD_RETRIES, DOWNLOAD_TIMEOUT
+from metrics import DOWNLOADED_BYTES, current_business
+
+logger = logging.getLogger(__name__)
+
+# Статуси, після яких є сенс повторити запит
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ImageDownloader:
+    """
+    Асинхронний завантажувач зображень на спільній aiohttp-сесії.
+    Пул з'єднань обмежений загалом і на кожен хост. Вміст повертається в пам'яті: на диск
+    його пише сховище і лише тоді, коли оригінал потрібно зберегти.
+    """
+
+    def __init__(self, max_connections: int = DOWNLOAD_MAX_CONNECTIONS, per_host: int = DOWNLOAD_PER_HOST_LIMIT,
+                 retries: int = DOWNLOAD_RETRIES, timeout: int = DOWNLOAD_TIMEOUT, backoff: float = 0.5):
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff = backoff
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _fetch(self, url: str) -> bytes:
+        """Один запит; байти одразу йдуть на хешування і варіанти, тож тимчасовий файл не потрібен."""
+        async with self._session.get(url) as response:
+            response.raise_for_status()
+            data = await response.read()
+        DOWNLOADED_BYTES.inc(len(data), business=current_business.get())
+        return data
+
+    async def download(self, url: str) -> bytes | None:
+        """Завантажує `url` з повторами та експоненційною затримкою. Повертає вміст або None."""
+        await self.start()
+        for attempt in range(self.retries + 1):
+            try:
+                return await self._fetch(url)
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRY_STATUSES or attempt == self.retries:
+                    logger.error(f"    - Помилка завантаження {url}: HTTP {e.status}")
+                    return None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    logger.error(f"    - Помилка завантаження {url}: {e!r}")
+                    return None
+
+            delay = self.backoff * (2 ** attempt) + random.uniform(0, self.backoff)
+            logger.info(f"    - Повтор завантаження через {delay:.1f} с (спроба {attempt + 2}/{self.retries + 1})")
+            await asyncio.sleep(delay)
+        return None
+
+
+_downloader: ImageDownloader | None = None
+
+
+def get_downloader() -> ImageDownloader:
+    """Повертає спільний для процесу завантажувач."""
+    global _downloader
+    if _downloader is None:
+        _downloader = ImageDownloader()
+    return _downloader
+
+
+async def close_downloader():
+    global _downloader
+    if _downloader is not None:
+        await _downloader.close()
+        _downloader = None
@@ -0,0 +1,111 @@
+import asyncio
+import io
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import imagehash
+from PIL import Image
+
+from config import (HASH_WORKERS, HASH_BATCH_SIZE, IMAGE_REPORT_MAX_SIDE, IMAGE_REPORT_QUALITY, IMAGE_THUMB_SIDE,
+                    IMAGE_THUMB_QUALITY)
+
+logger = logging.getLogger(__name__)
+
+# phash зменшує зображення до 32x32, тож JPEG достатньо декодувати у зменшеному масштабі
+DRAFT_SIZE = (64, 64)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def phash_bytes(data: bytes) -> str:
+    """
+    Рахує pHash просто з байтів зображення, декодуючи JPEG одразу у зменшеному розмірі.
+    Від pHash повністю декодованого зображення відрізняється на 0–2 біти з 64, тож хеші
+    обох способів не змішуються: старі перераховує clustering.rehash_legacy_ads.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        # draft() працює лише для JPEG: декодер пропускає зайві DCT-коефіцієнти (масштаб до 1/8)
+        img.draft('L', DRAFT_SIZE)
+        return str(imagehash.phash(img))
+
+
+def _encode_jpeg(img: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def make_variants(data: bytes) -> tuple[bytes, bytes]:
+    """
+    Стиснена копія для звітів (довша сторона не більше IMAGE_REPORT_MAX_SIDE) і мініатюра.
+    Якщо оригінал — JPEG у межах розміру і перекодування його не зменшує, він і є копією для звітів.
+    """
+    with Image.open(io.BytesIO(data)) as img:
+        is_small_jpeg = img.format == 'JPEG' and max(img.size) <= IMAGE_REPORT_MAX_SIDE
+        # Декодуємо одразу в масштабі, не меншому за потрібний розмір
+        img.draft('RGB', (IMAGE_REPORT_MAX_SIDE, IMAGE_REPORT_MAX_SIDE))
+        report = img.convert('RGB')
+    report.thumbnail((IMAGE_REPORT_MAX_SIDE, IMAGE_REPORT_MAX_SIDE), Image.LANCZOS)
+    report_bytes = _encode_jpeg(report, IMAGE_REPORT_QUALITY)
+    if is_small_jpeg and len(report_bytes) >= len(data):
+        report_bytes = data
+
+    report.thumbnail((IMAGE_THUMB_SIDE, IMAGE_THUMB_SIDE), Image.LANCZOS)
+    return report_bytes, _encode_jpeg(report, IMAGE_THUMB_QUALITY)
+
+
+def _process_batch(batch: list[bytes]) -> list[tuple | None]:
+    """Виконується у дочірньому процесі: pHash і варіанти для пачки, помилки перетворює на None."""
+    results = []
+    for data in batch:
+        try:
+            results.append((phash_bytes(data), *make_variants(data)))
+        except Exception:
+            results.append(None)
+    return results
+
+
+def phash_files(paths: list[str]) -> list[str | None]:
+    """Виконується у дочірньому процесі: pHash файлів з диска; відсутні й пошкоджені дають None."""
+    hashes = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                hashes.append(phash_bytes(f.read()))
+        except Exception:
+            hashes.append(None)
+    return hashes
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def process_images(images: list[bytes], batch_size: int = HASH_BATCH_SIZE) -> list[tuple | None]:
+    """
+    Для кожного зображення рахує в пулі процесів (pHash, байти копії для звітів, байти мініатюри).
+    Зображення, які не вдалося декодувати, дають None.
+    """
+    if not images:
+        return []
+
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    batches = [images[i:i + batch_size] for i in range(0, len(images), batch_size)]
+    results = await asyncio.gather(*(loop.run_in_executor(executor, _process_batch, batch) for batch in batches))
+
+    processed = [item for batch in results for item in batch]
+    failed = processed.count(None)
+    if failed:
+        logger.error(f"    - Не вдалося обробити {failed} зображень.")
+    return processed
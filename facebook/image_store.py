@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+from sqlalchemy import select, update
+
+from config import KEEP_ORIGINAL_IMAGES
+from database.crud import get_blobs_by_url, get_blobs, insert_blobs, link_urls, bump_data_generation
+from database.models import AsyncSession, AdCreative, ImageBlob
+from facebook.downloader import get_downloader
+from facebook.hashing import process_images, shutdown_executor
+from metrics import phase
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = Path('images')
+IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def url_key(url: str) -> str:
+    """
+    Ключ кешу для URL креативу. Підписані параметри CDN (oh, oe, _nc_*) змінюються між
+    запитами, тож ключем є шлях файлу плюс параметр розміру `stp`, якщо він є.
+    """
+    parts = urlsplit(url)
+    stp = parse_qs(parts.query).get('stp')
+    return f"{parts.path}?stp={stp[0]}" if stp else parts.path
+
+
+class ImageStore:
+    """
+    Сховище зображень, адресоване за sha256 завантажених байтів: images/ab/cd/<digest>.<variant>.jpg.
+    На кожен блоб зберігаються стиснена копія для звітів (report) і мініатюра (thumb),
+    оригінал (<digest>.jpg) — лише з KEEP_ORIGINAL_IMAGES. Однакові креативи різних
+    оголошень зберігаються один раз, а URL, що вже завантажувались, повторно не качаються.
+    """
+
+    def __init__(self, root: Path = IMAGES_DIR):
+        self.root = root
+        # Сюди колись завантажувались тимчасові файли; очищення прибирає їхні залишки
+        self.tmp_dir = root / 'tmp'
+
+    def blob_path(self, digest: str, variant: str | None = None) -> Path:
+        name = f'{digest}.{variant}.jpg' if variant else f'{digest}.jpg'
+        return self.root / digest[:2] / digest[2:4] / name
+
+    @staticmethod
+    def _write(path: Path, data: bytes):
+        if path.exists():
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.part')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def store(self, digest: str, data: bytes | None, processed: tuple | None) -> dict:
+        """
+        Записує варіанти блобу і повертає поля рядка ImageBlob. Оригінал `data` пишеться на диск
+        лише з KEEP_ORIGINAL_IMAGES або якщо зображення не вдалося декодувати — тоді для звітів лишається він.
+        """
+        fields = {'thumb_path': None, 'original_path': None}
+        if processed is not None:
+            _, report, thumb = processed
+            report_path, thumb_path = self.blob_path(digest, 'report'), self.blob_path(digest, 'thumb')
+            self._write(report_path, report)
+            self._write(thumb_path, thumb)
+            fields.update(local_path=str(report_path), thumb_path=str(thumb_path))
+        if processed is None or KEEP_ORIGINAL_IMAGES:
+            original_path = self.blob_path(digest)
+            if data is not None:
+                self._write(original_path, data)
+            if original_path.exists():
+                fields['original_path'] = str(original_path)
+                fields.setdefault('local_path', str(original_path))
+        paths = {fields.get('local_path'), fields['thumb_path'], fields['original_path']}
+        fields['stored_bytes'] = sum(os.path.getsize(path) for path in paths if path)
+        return fields
+
+    async def _download(self, url: str) -> tuple[str, bytes] | None:
+        data = await get_downloader().download(url)
+        if data is None:
+            logger.error(f"    - Не вдалося завантажити зображення {url}")
+            return None
+        return hashlib.sha256(data).hexdigest(), data
+
+    async def fetch(self, session, urls) -> dict[str, dict]:
+        """
+        Повертає {url: {'digest', 'local_path', 'image_hash'}} для всіх URL, які вдалося отримати.
+        Відомі URL беруться з кешу, решта завантажуються паралельно; pHash і варіанти
+        рахуються лише для нових блобів. `local_path` — копія для звітів.
+        Блоби й кеш URL записуються в сесію, коміт — за викликачем.
+        """
+        keys = {url: url_key(url) for url in set(urls)}
+        cached = await get_blobs_by_url(session, set(keys.values()))
+
+        # Кілька оголошень можуть мати один URL — качаємо його один раз
+        to_download = {}
+        for url, key in keys.items():
+            if key not in cached:
+                to_download.setdefault(key, url)
+        with phase('image_download'):
+            results = await asyncio.gather(*(self._download(url) for url in to_download.values()))
+        downloaded = {key: result for key, result in zip(to_download, results) if result}
+        if to_download:
+            logger.info(f"    - Зображень з кешу: {len(keys) - len(to_download)}, завантажено: {len(downloaded)}.")
+
+        # Ті самі байти могли прийти з іншого URL — такі блоби вже мають хеш
+        known = await get_blobs(session, {digest for digest, _ in downloaded.values()})
+        fresh = {}
+        for digest, data in downloaded.values():
+            if digest not in known:
+                fresh.setdefault(digest, data)
+        with phase('hashing'):
+            processed = await process_images(list(fresh.values()))
+
+        def store_all():
+            return [self.store(digest, data, item) for (digest, data), item in zip(fresh.items(), processed)]
+
+        stored = await asyncio.to_thread(store_all)
+
+        blobs = {digest: {'digest': digest, 'local_path': blob.local_path, 'image_hash': blob.image_hash}
+                 for digest, blob in known.items()}
+        new_rows = []
+        for (digest, data), item, fields in zip(fresh.items(), processed, stored):
+            image_hash = item[0] if item else None
+            new_rows.append({'digest': digest, 'size_bytes': len(data), 'image_hash': image_hash, 'ref_count': 0,
+                             **fields})
+            blobs[digest] = {'digest': digest, 'local_path': fields['local_path'], 'image_hash': image_hash}
+        await insert_blobs(session, new_rows)
+        await link_urls(session, {key: digest for key, (digest, _) in downloaded.items()})
+
+        result = {}
+        for url, key in keys.items():
+            if key in cached:
+                blob = cached[key]
+                result[url] = {'digest': blob.digest, 'local_path': blob.local_path, 'image_hash': blob.image_hash}
+            elif key in downloaded:
+                result[url] = blobs[downloaded[key][0]]
+        return result
+
+
+image_store = ImageStore()
+
+
+def _unlink_paths(paths):
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+async def backfill_variants(batch_size: int = 200):
+    """
+    Разово створює варіанти для блобів, збережених до їх появи: копія для звітів стає
+    local_path блобу та його оголошень, оригінал видаляється, якщо не ввімкнено KEEP_ORIGINAL_IMAGES.
+    """
+    last_digest = ''
+    total, saved = 0, 0
+    try:
+        while True:
+            async with AsyncSession() as session:
+                blobs = (await session.execute(
+                    select(ImageBlob)
+                    .where(ImageBlob.digest > last_digest, ImageBlob.thumb_path.is_(None))
+                    .order_by(ImageBlob.digest)
+                    .limit(batch_size)
+                )).scalars().all()
+                if not blobs:
+                    break
+                last_digest = blobs[-1].digest
+
+                blobs = [blob for blob in blobs if blob.local_path and os.path.exists(blob.local_path)]
+                datas = await asyncio.gather(*(asyncio.to_thread(Path(blob.local_path).read_bytes) for blob in blobs))
+                processed = await process_images(list(datas))
+                replaced = []
+                for blob, data, item in zip(blobs, datas, processed):
+                    if item is None:
+                        continue
+                    fields = await asyncio.to_thread(image_store.store, blob.digest, None, item)
+                    if not KEEP_ORIGINAL_IMAGES:
+                        replaced.append(Path(blob.local_path))
+                    await session.execute(update(ImageBlob).where(ImageBlob.digest == blob.digest).values(**fields))
+                    await session.execute(update(AdCreative).where(AdCreative.image_digest == blob.digest)
+                                          .values(local_path=fields['local_path']))
+                    total += 1
+                    saved += len(data) - fields['stored_bytes']
+                # Закешовані звіти посилаються на старі local_path
+                await bump_data_generation(session)
+                await session.commit()
+
+            # Оригінали видаляються лише після коміту: інакше при помилці рядки вказували б на відсутні файли
+            await asyncio.to_thread(_unlink_paths, replaced)
+            logger.info(f"Створено варіанти для {total} блобів...")
+    finally:
+        shutdown_executor()
+    logger.info(f"✅ Backfill варіантів завершено: {total} блобів, звільнено {saved / 1024 / 1024:.1f} МБ.")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    asyncio.run(backfill_variants())
@@ -0,0 +1,130 @@
+import json
+import logging
+import re
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Відповіді, у яких бібліотека реклами віддає дані оголошень
+AD_RESPONSE_MARKERS = ('/api/graphql', '/ads/library/async/')
+# Перша сторінка результатів приходить не через XHR, а вбудованим JSON у самому документі
+SCRIPT_JSON_RE = re.compile(r'<script type="application/json"[^>]*>(.*?)</script>', re.DOTALL)
+XSSI_PREFIX = 'for (;;);'
+
+
+def iter_json_payloads(text: str):
+    """Розбирає тіло відповіді: прибирає XSSI-префікс і підтримує кілька JSON-документів по рядках."""
+    text = text.strip()
+    if text.startswith(XSSI_PREFIX):
+        text = text[len(XSSI_PREFIX):]
+    try:
+        yield json.loads(text)
+        return
+    except ValueError:
+        pass
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def _first_image_url(snapshot: dict) -> str | None:
+    """URL креативу: спершу зображення оголошення, далі картки каруселі, далі прев'ю відео."""
+    for key in ('images', 'cards'):
+        for item in snapshot.get(key) or []:
+            url = item.get('original_image_url') or item.get('resized_image_url')
+            if url:
+                return url
+    for video in snapshot.get('videos') or []:
+        if video.get('video_preview_image_url'):
+            return video['video_preview_image_url']
+    return None
+
+
+def ad_record_from_json(node: dict) -> dict | None:
+    """Перетворює вузол з `ad_archive_id` на запис того ж формату, що й HTML-парсер."""
+    ad_id = node.get('ad_archive_id')
+    snapshot = node.get('snapshot')
+    if not ad_id or not isinstance(snapshot, dict):
+        return None
+
+    start_date = None
+    if isinstance(node.get('start_date'), (int, float)):
+        start_date = datetime.fromtimestamp(node['start_date'], tz=timezone.utc).date()
+
+    # У розмітці "використовуються в N оголошеннях" з'являється лише для N > 1
+    collation_count = node.get('collation_count') or 0
+    return {
+        'ad_id': str(ad_id),
+        'start_date': start_date,
+        'img_url': _first_image_url(snapshot),
+        'similar_count': collation_count if collation_count > 1 else 0,
+    }
+
+
+def find_ad_records(payload):
+    """Рекурсивно обходить JSON і повертає всі знайдені записи оголошень."""
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if 'ad_archive_id' in node:
+                record = ad_record_from_json(node)
+                if record:
+                    yield record
+                    continue
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+
+
+class AdResponseCollector:
+    """
+    Слухає відповіді сторінки через Playwright і збирає оголошення з JSON,
+    щоб не парсити відрендерений HTML.
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.ads: dict[str, dict] = {}
+        self.responses_parsed = 0
+
+    def attach(self):
+        self.page.on('response', self._on_response)
+        return self
+
+    def detach(self):
+        self.page.remove_listener('response', self._on_response)
+
+    def feed(self, text: str):
+        """Додає оголошення з тіла однієї відповіді (також використовується з записаних фікстур)."""
+        for payload in iter_json_payloads(text):
+            for record in find_ad_records(payload):
+                self.ads.setdefault(record['ad_id'], record)
+        self.responses_parsed += 1
+
+    def covers(self, cards_on_page: int) -> bool:
+        """
+        Чи можна віддати перевагу мережевим даним: вони мають покривати всі картки на сторінці,
+        інакше деактивація помилково зачепила б не захоплені оголошення.
+        """
+        return bool(self.ads) and len(self.ads) >= cards_on_page
+
+    def feed_document(self, html: str):
+        for script_body in SCRIPT_JSON_RE.findall(html):
+            if 'ad_archive_id' in script_body:
+                self.feed(script_body)
+
+    async def _on_response(self, response):
+        try:
+            if response.request.resource_type == 'document':
+                self.feed_document(await response.text())
+            elif any(marker in response.url for marker in AD_RESPONSE_MARKERS):
+                self.feed(await response.text())
+        except Exception as e:
+            # Відповідь могла бути перенаправлена або скасована; HTML-шлях залишиться запасним
+            logger.debug(f"  -> Не вдалося прочитати відповідь {response.url}: {e}")
@@ -0,0 +1,93 @@
+import logging
+import re
+from collections import Counter
+
+from config import BLOCKED_RESOURCE_TYPES, BLOCKED_URL_PATTERNS
+from metrics import ROUTED_REQUESTS, ROUTED_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Орієнтовний розмір скасованого запиту, доки не побачено жодної дозволеної відповіді цього типу
+DEFAULT_RESPONSE_BYTES = {
+    'image': 60_000,
+    'media': 500_000,
+    'font': 40_000,
+    'script': 30_000,
+    'xhr': 5_000,
+    'fetch': 5_000,
+}
+FALLBACK_RESPONSE_BYTES = 5_000
+
+
+class RoutingPolicy:
+    """
+    Політика маршрутизації для контекстів Playwright: скасовує непотрібні типи ресурсів
+    і трекери, рахує дозволені та заблоковані запити за прогін воркера.
+    Ті самі лічильники накопичуються в метриках процесу.
+    """
+
+    def __init__(self, blocked_types=BLOCKED_RESOURCE_TYPES, blocked_patterns=BLOCKED_URL_PATTERNS):
+        self.blocked_types = set(blocked_types)
+        self.blocked_re = re.compile('|'.join(blocked_patterns)) if blocked_patterns else None
+        self.reset()
+
+    def reset(self):
+        """Обнуляє лічильники прогону; метрики процесу не чіпає."""
+        self.allowed = Counter()
+        self.blocked = Counter()
+        self.allowed_bytes = Counter()
+        self._sized_responses = Counter()
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_types:
+            return True
+        return bool(self.blocked_re and self.blocked_re.search(url))
+
+    async def install(self, context):
+        await context.route('**/*', self._handle_route)
+        context.on('response', self._on_response)
+
+    async def _handle_route(self, route):
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked[request.resource_type] += 1
+            ROUTED_REQUESTS.inc(resource_type=request.resource_type, action='blocked')
+            ROUTED_BYTES.inc(self.average_bytes(request.resource_type), resource_type=request.resource_type,
+                             action='saved')
+            await route.abort()
+        else:
+            self.allowed[request.resource_type] += 1
+            ROUTED_REQUESTS.inc(resource_type=request.resource_type, action='allowed')
+            await route.continue_()
+
+    def _on_response(self, response):
+        length = response.headers.get('content-length')
+        if length and length.isdigit():
+            resource_type = response.request.resource_type
+            self.allowed_bytes[resource_type] += int(length)
+            self._sized_responses[resource_type] += 1
+            ROUTED_BYTES.inc(int(length), resource_type=resource_type, action='allowed')
+
+    def average_bytes(self, resource_type: str) -> int:
+        if self._sized_responses[resource_type]:
+            return self.allowed_bytes[resource_type] // self._sized_responses[resource_type]
+        return DEFAULT_RESPONSE_BYTES.get(resource_type, FALLBACK_RESPONSE_BYTES)
+
+    def estimated_bytes_saved(self) -> int:
+        return sum(count * self.average_bytes(resource_type) for resource_type, count in self.blocked.items())
+
+    def summary(self) -> dict:
+        return {
+            'allowed': sum(self.allowed.values()),
+            'blocked': sum(self.blocked.values()),
+            'blocked_by_type': dict(self.blocked),
+            'allowed_bytes': sum(self.allowed_bytes.values()),
+            'estimated_bytes_saved': self.estimated_bytes_saved(),
+        }
+
+    def log_summary(self):
+        summary = self.summary()
+        by_type = ', '.join(f"{t}: {c}" for t, c in sorted(summary['blocked_by_type'].items())) or '—'
+        logger.info(f"🚦 Запити: дозволено {summary['allowed']} ({summary['allowed_bytes'] / 1e6:.1f} МБ), "
+                    f"заблоковано {summary['blocked']} ({by_type}), "
+                    f"зекономлено ~{summary['estimated_bytes_saved'] / 1e6:.1f} МБ.")
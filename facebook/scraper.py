@@ -1,20 +1,23 @@
 import asyncio
 import re
+import time
 from datetime import date, datetime
-from pathlib import Path
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-import imagehash
-import requests
-from PIL import Image
 from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright
+from sqlalchemy import select
 
-import shared_state
-from database.models import Session, Business, AdCreative
+from metrics import ADS_TOTAL, business_scope, phase
+from config import SCRAPE_EXTRACTION_MODE, SCROLL_MAX_SCROLLS, SCROLL_MAX_SECONDS, SCROLL_IDLE_SECONDS
+from database.crud import (get_known_ad_ids, upsert_ads, deactivate_missing_ads, refresh_ref_counts,
+                           bump_data_generation)
+from database.models import AsyncSession, Business
+from facebook.clustering import cluster_index
+from facebook.image_store import image_store
+from facebook.network_capture import AdResponseCollector
 
 
 # --- КОНФІГУРАЦІЯ СКРАПЕРА ---
@@ -33,9 +36,48 @@ MONTH_MAP = {
 }
 
 
-IMAGES_DIR = Path('images')
-IMAGES_DIR.mkdir(parents=True, exist_ok=True)
-
+# Стан стрічки: кількість унікальних ID оголошень і висота документа
+FEED_STATE_JS = r'''() => {
+    const ids = new Set(document.body.textContent.match(/Ідентифікатор бібліотеки:\s*\d+/g) || []);
+    return {ids: ids.size, height: document.body.scrollHeight};
+}'''
+# Пошук карток прямо в браузері: повертає компактні записи замість усього HTML.
+# Картка — найближчий div-предок тексту з ID, що містить <hr> (як і в extract_ads_from_html).
+EXTRACT_CARDS_JS = r'''() => {
+    const ID_RE = /Ідентифікатор бібліотеки:\s*(\d+)/;
+    const SIMILAR_RE = /використовуються в\s+(\d+)\s+оголошеннях/;
+    const START_MARKER = 'Початок показу';
+    const cardText = (card) => {
+        const parts = [];
+        const walker = document.createTreeWalker(card, NodeFilter.SHOW_TEXT);
+        while (walker.nextNode()) parts.push(walker.currentNode.nodeValue);
+        return parts.join(' ');
+    };
+    const seen = new Set();
+    const ads = [];
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    while (walker.nextNode()) {
+        const match = ID_RE.exec(walker.currentNode.nodeValue);
+        if (!match || seen.has(match[1])) continue;
+        let card = walker.currentNode.parentElement;
+        while (card && !(card.tagName === 'DIV' && card.querySelector('hr'))) card = card.parentElement;
+        if (!card) continue;
+        seen.add(match[1]);
+        const text = cardText(card);
+        const startAt = text.indexOf(START_MARKER);
+        const similar = SIMILAR_RE.exec(text);
+        ads.push({
+            ad_id: match[1],
+            start_text: startAt >= 0 ? text.slice(startAt, startAt + 64) : '',
+            img_srcs: Array.from(card.querySelectorAll('img'), (img) => img.getAttribute('src')),
+            similar_count: similar ? parseInt(similar[1], 10) : 0,
+        });
+    }
+    return ads;
+}'''
+SCROLL_POLL_INTERVAL = 0.25
+# Скільки чекати на першу картку, перш ніж вважати сторінку порожньою
+INITIAL_ADS_TIMEOUT = 10000
 
 def parse_start_date(text: str) -> date | None:
     """Витягує та перетворює дату запуску реклами з текстового рядка."""
@@ -64,67 +106,55 @@ def parse_start_date(text: str) -> date | None:
         return None
 
 
-def download_image(ad_id: str, img_url: str) -> str | None:
-    """Завантажує одне зображення та повертає локальний шлях."""
-    local_path = IMAGES_DIR / f'{ad_id}.jpg'
-    try:
-        r = requests.get(img_url, timeout=15)
-        r.raise_for_status()
-        with open(local_path, 'wb') as f:
-            f.write(r.content)
-        logger.info(f"    - Збережено зображення: {local_path}")
-        return str(local_path)
-    except requests.exceptions.RequestException as req_err:
-        logger.error(f"    - Помилка завантаження зображення для {ad_id}: {req_err}")
-        return None
-
-
-async def fetch_ads_for_business(page, business: Business):
+async def scroll_until_exhausted(page, max_scrolls: int = SCROLL_MAX_SCROLLS, max_seconds: float = SCROLL_MAX_SECONDS,
+                                 idle_seconds: float = SCROLL_IDLE_SECONDS) -> dict:
     """
-    Витягує рекламні оголошення для конкретного бізнесу, реалізуючи всю фінальну логіку.
+    Прокручує стрічку, доки після чергової прокрутки протягом `idle_seconds`
+    не з'являються нові ID оголошень і не росте висота сторінки.
+    Зупиняється також за лімітом прокруток або часу. Повертає статистику прокручування.
     """
-    url = ADS_URL_TEMPLATE.format(business.fb_page_id)
-    logger.info(f"  -> Перехід до URL для бізнесу '{business.name}' (ID: {business.fb_page_id})")
-
+    started = time.perf_counter()
     try:
-        await page.goto(url, wait_until='domcontentloaded', timeout=30000)
-    except Exception as e:
-        logger.error(f"  -> Не вдалося завантажити URL: {e}")
-        return
-
-    try:
-        logger.info("  -> Шукаю спливаюче вікно cookie...")
-        cookie_button = page.locator(
-            '//button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "allow all")]'
-            '| //button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "accept all")]'
-            '| //button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "дозволити")]'
-        ).first
-        await cookie_button.wait_for(timeout=7000)
-        await cookie_button.click()
-        logger.info("  -> Спливаюче вікно cookie успішно закрито.")
-        await page.wait_for_timeout(2000)
+        await page.wait_for_function(f'() => ({FEED_STATE_JS})().ids > 0', timeout=INITIAL_ADS_TIMEOUT)
     except Exception:
-        logger.info("  -> Спливаюче вікно cookie не знайдено, продовжую...")
+        logger.info("  -> Картки оголошень не з'явилися, сторінка, ймовірно, порожня.")
 
-    logger.info("  -> Прокручую сторінку для завантаження оголошень...")
-    for _ in range(5):
+    state = await page.evaluate(FEED_STATE_JS)
+    scrolls = 0
+    exhausted = False
+    while scrolls < max_scrolls and time.perf_counter() - started < max_seconds:
         await page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
-        await asyncio.sleep(2)
+        scrolls += 1
+
+        idle_started = time.perf_counter()
+        grew = False
+        while time.perf_counter() - idle_started < idle_seconds:
+            await asyncio.sleep(SCROLL_POLL_INTERVAL)
+            new_state = await page.evaluate(FEED_STATE_JS)
+            if new_state['ids'] > state['ids'] or new_state['height'] > state['height']:
+                state = new_state
+                grew = True
+                break
+        if not grew:
+            exhausted = True
+            break
+
+    return {
+        'scrolls': scrolls,
+        'scroll_seconds': round(time.perf_counter() - started, 1),
+        'exhausted': exhausted,
+        'ads_on_page': state['ids'],
+    }
 
-    try:
-        logger.info("  -> Очікую 5 секунд, щоб сторінка гарантовано завантажилася...")
-        await page.wait_for_timeout(5000)
-        logger.info("  -> Отримую HTML-вміст сторінки...")
-        html = await page.content()
-        soup = BeautifulSoup(html, 'html.parser')
-    except Exception as e:
-        logger.error(f"  -> Помилка під час фіксованого очікування або отримання контенту: {e}")
-        screenshot_path = f"debug_screenshot_{business.fb_page_id}.png"
-        await page.screenshot(path=screenshot_path)
-        logger.info(f"  -> Збережено скріншот для аналізу: {screenshot_path}.")
-        return
 
-    # 1. Збираємо картки для всіх унікальних ID оголошень
+def extract_ads_from_html(html: str) -> dict[str, dict]:
+    """
+    Розбирає відрендерений HTML бібліотеки реклами.
+    Повертає записи {ad_id, start_date, img_url, similar_count} за ID оголошення.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Збираємо картки для всіх унікальних ID оголошень
     ad_cards_map = {}
     id_elements = soup.find_all(string=re.compile(r'Ідентифікатор бібліотеки:'))
 
@@ -143,138 +173,227 @@ async def fetch_ads_for_business(page, business: Business):
         if ad_card:
             ad_cards_map[ad_id] = ad_card
 
-    logger.info(f"  -> Знайдено {len(ad_cards_map)} унікальних оголошень для '{business.name}'.")
-    if not ad_cards_map:
-        return
+    records = {}
+    for ad_id, ad_card in ad_cards_map.items():
+        # Перше зображення картки — аватар сторінки, креатив — друге
+        all_img_tags = ad_card.find_all('img')
+        img_url = all_img_tags[1].get('src') if len(all_img_tags) > 1 else None
+
+        # Витягнення кількості використання у інших рекламах
+        similar_count = 0
+        match = re.search(r'використовуються в\s+(\d+)\s+оголошеннях', ad_card.get_text())
+        if match:
+            similar_count = int(match.group(1))
+
+        records[ad_id] = {
+            'ad_id': ad_id,
+            'start_date': parse_start_date(ad_card.get_text(separator=' ')),
+            'img_url': img_url,
+            'similar_count': similar_count,
+        }
+    return records
 
+
+async def extract_ads_in_page(page) -> dict[str, dict]:
+    """
+    Знаходить картки оголошень у самому браузері через page.evaluate.
+    Python-сторона лише перевіряє компактні записи й приводить їх до спільного формату.
+    """
+    records = {}
+    for item in await page.evaluate(EXTRACT_CARDS_JS):
+        ad_id = str(item.get('ad_id', ''))
+        if not ad_id.isdigit() or ad_id in records:
+            continue
+        img_srcs = item.get('img_srcs') or []
+        similar_count = item.get('similar_count')
+        records[ad_id] = {
+            'ad_id': ad_id,
+            'start_date': parse_start_date(item.get('start_text') or ''),
+            # Перше зображення картки — аватар сторінки, креатив — друге
+            'img_url': img_srcs[1] if len(img_srcs) > 1 else None,
+            'similar_count': similar_count if isinstance(similar_count, int) else 0,
+        }
+    return records
+
+
+async def load_ads_from_page(page, business: Business) -> tuple[dict[str, dict], dict] | None:
+    """
+    Відкриває сторінку бізнесу, прокручує стрічку і повертає (записи оголошень, статистику).
+    Режими SCRAPE_EXTRACTION_MODE: 'network' — JSON-відповіді, за їх нестачі пошук карток у браузері;
+    'dom' — лише пошук карток у браузері; 'html' — розбір повного HTML через BeautifulSoup.
+    """
+    url = ADS_URL_TEMPLATE.format(business.fb_page_id)
+    logger.info(f"  -> Перехід до URL для бізнесу '{business.name}' (ID: {business.fb_page_id})")
+
+    collector = AdResponseCollector(page).attach() if SCRAPE_EXTRACTION_MODE == 'network' else None
+    try:
+        try:
+            with phase('page_load'):
+                await page.goto(url, wait_until='domcontentloaded', timeout=30000)
+        except Exception as e:
+            logger.error(f"  -> Не вдалося завантажити URL: {e}")
+            return None
+
+        try:
+            logger.info("  -> Шукаю спливаюче вікно cookie...")
+            cookie_button = page.locator(
+                '//button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "allow all")]'
+                '| //button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "accept all")]'
+                '| //button[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "дозволити")]'
+            ).first
+            await cookie_button.wait_for(timeout=7000)
+            await cookie_button.click()
+            logger.info("  -> Спливаюче вікно cookie успішно закрито.")
+            await page.wait_for_timeout(2000)
+        except Exception:
+            logger.info("  -> Спливаюче вікно cookie не знайдено, продовжую...")
+
+        try:
+            logger.info("  -> Прокручую сторінку, доки не закінчаться оголошення...")
+            with phase('scroll'):
+                scroll_stats = await scroll_until_exhausted(page)
+            logger.info(f"  -> Прокрутки: {scroll_stats['scrolls']}, {scroll_stats['scroll_seconds']} с, "
+                        f"карток на сторінці: {scroll_stats['ads_on_page']}"
+                        f"{'' if scroll_stats['exhausted'] else ' (зупинено за лімітом)'}.")
+
+            with phase('extraction'):
+                if collector and collector.covers(scroll_stats['ads_on_page']):
+                    logger.info(f"  -> Дані взято з {collector.responses_parsed} мережевих відповідей.")
+                    return dict(collector.ads), {**scroll_stats, 'source': 'network'}
+
+                if SCRAPE_EXTRACTION_MODE == 'html':
+                    logger.info("  -> Отримую HTML-вміст сторінки...")
+                    html = await page.content()
+                    return extract_ads_from_html(html), {**scroll_stats, 'source': 'html'}
+
+                return await extract_ads_in_page(page), {**scroll_stats, 'source': 'dom'}
+        except Exception as e:
+            logger.error(f"  -> Помилка під час прокручування або отримання контенту: {e}")
+            screenshot_path = f"debug_screenshot_{business.fb_page_id}.png"
+            await page.screenshot(path=screenshot_path)
+            logger.info(f"  -> Збережено скріншот для аналізу: {screenshot_path}.")
+            return None
+    finally:
+        if collector:
+            collector.detach()
+
+
+async def save_ads(business: Business, ads: dict[str, dict], stats: dict) -> dict:
+    """
+    Зберігає записи оголошень бізнесу: завантажує креативи нових, оновлює відомі, деактивує зниклі.
+    Якщо зберегти не вдалося, зміни відкочуються, а виняток передається далі.
+    """
     today = date.today()
-    session = Session()
+    session = AsyncSession()
     try:
-        scraped_ad_ids = set(ad_cards_map.keys())
-
-        # 2. Обробляємо кожне унікальне оголошення
-        for ad_id, ad_card in ad_cards_map.items():
-            existing_ad = session.query(AdCreative).filter_by(fb_ad_id=ad_id).first()
-
-            if existing_ad:
-                # ОНОВЛЕННЯ ІСНУЮЧОГО
-                existing_ad.last_seen = today
-                existing_ad.is_active = True
-                existing_ad.duration_days = (today - existing_ad.start_date).days + 1
-                logger.info(f"    - Оновлено оголошення: ID {ad_id}, днів: {existing_ad.duration_days}")
-            else:
-                # ДОДАВАННЯ НОВОГО
-                start_date = parse_start_date(ad_card.get_text(separator=' '))
-                if not start_date:
-                    logger.error(f"  -> Помилка: Не знайдено дату початку в оголошенні {ad_id}.")
-                    continue
-
-                # Логіка завантаження другого зображення
-                all_img_tags = ad_card.find_all('img')
-                img_url, local_path, image_hash_str = None, None, None
-
-                if len(all_img_tags) > 1:
-                    img_tag = all_img_tags[1]
-                    src = img_tag.get('src')
-                    if src:
-                        img_url = src
-                        local_path = download_image(ad_id, src)
-                        # Розрахунок перцептивного хешу
-                        if local_path:
-                            try:
-                                hash_value = imagehash.phash(Image.open(local_path))
-                                image_hash_str = str(hash_value)
-                            except Exception as e:
-                                logger.error(f"    - Помилка розрахунку хешу для {local_path}: {e}")
-                else:
-                    logger.warning(f"    - Попередження: Не знайдено другого зображення для нового оголошення {ad_id}.")
-
-                # Витягнення кількості використання у інших рекламах
-                similar_ads_count = 0
-                card_text = ad_card.get_text()
-                match = re.search(r'використовуються в\s+(\d+)\s+оголошеннях', card_text)
-                if match:
-                    similar_ads_count = int(match.group(1))
-
-                new_ad = AdCreative(
-                    fb_ad_id=ad_id,
-                    business_id=business.id,
-                    image_url=img_url,
-                    local_path=local_path,
-                    image_hash=image_hash_str,
-                    similar_ads_count=similar_ads_count,
-                    start_date=start_date,
-                    last_seen=today,
-                    is_active=True,
-                    duration_days=(today - start_date).days + 1
-                )
-                session.add(new_ad)
-                logger.info(f"    - Додано нове оголошення: ID {ad_id}, схожих: {similar_ads_count}, днів: {new_ad.duration_days}.")
-
-        # 3. Деактивація старих оголошень
-        active_db_ads = session.query(AdCreative).filter_by(business_id=business.id, is_active=True).all()
-        for ad in active_db_ads:
-            if ad.fb_ad_id not in scraped_ad_ids:
-                ad.is_active = False
-                ad.end_date = today
-                logger.info(f"    - Деактивовано оголошення: ID {ad.fb_ad_id}.")
-
-        session.commit()
-        logger.info(f"  -> Зміни для бізнесу '{business.name}' збережено.")
+        scraped_ad_ids = set(ads.keys())
+        # Один запит на всі ID замість окремого SELECT для кожної картки
+        known_ad_ids = await get_known_ad_ids(session, scraped_ad_ids)
+
+        # Обробляємо кожне унікальне оголошення
+        rows = []
+        new_ads = []
+        for ad_id, ad in ads.items():
+            if ad_id in known_ad_ids:
+                # ОНОВЛЕННЯ ІСНУЮЧОГО: решту полів upsert не чіпає при конфлікті
+                rows.append({
+                    'fb_ad_id': ad_id, 'business_id': business.id, 'image_url': None, 'local_path': None,
+                    'image_digest': None, 'image_hash': None, 'cluster_id': None, 'similar_ads_count': 0, 'start_date': None,
+                    'last_seen': today, 'is_active': True, 'duration_days': 1,
+                })
+                continue
+
+            # ДОДАВАННЯ НОВОГО
+            if not ad['start_date']:
+                logger.error(f"  -> Помилка: Не знайдено дату початку в оголошенні {ad_id}.")
+                continue
+            if not ad['img_url']:
+                logger.warning(f"    - Попередження: Не знайдено зображення для нового оголошення {ad_id}.")
+            new_ads.append(ad)
+
+        # Креативи нових оголошень: спільні блоби зі сховища, невідомі URL качаються паралельно
+        blobs = await image_store.fetch(session, [ad['img_url'] for ad in new_ads if ad['img_url']])
+        # Кластер схожих креативів призначається одразу при вставці, тож звіт стає GROUP BY
+        clusters = await cluster_index.assign_locked(session, [
+            (ad['ad_id'], blobs[ad['img_url']]['image_hash']) for ad in new_ads
+            if ad['img_url'] in blobs and blobs[ad['img_url']]['image_hash']
+        ])
+
+        for ad in new_ads:
+            blob = blobs.get(ad['img_url'], {})
+            duration_days = (today - ad['start_date']).days + 1
+            rows.append({
+                'fb_ad_id': ad['ad_id'],
+                'business_id': business.id,
+                'image_url': ad['img_url'],
+                'local_path': blob.get('local_path'),
+                'image_digest': blob.get('digest'),
+                'image_hash': blob.get('image_hash'),
+                'cluster_id': clusters.get(ad['ad_id']),
+                'similar_ads_count': ad['similar_count'],
+                'start_date': ad['start_date'],
+                'last_seen': today,
+                'is_active': True,
+                'duration_days': duration_days,
+            })
+            logger.info(f"    - Нове оголошення: ID {ad['ad_id']}, схожих: {ad['similar_count']}, днів: {duration_days}.")
+
+        with phase('db_commit'):
+            await upsert_ads(session, rows)
+            await refresh_ref_counts(session, {blob['digest'] for blob in blobs.values()})
+
+            # Деактивація старих оголошень одним UPDATE
+            deactivated = await deactivate_missing_ads(session, business.id, scraped_ad_ids, today)
+            if deactivated:
+                logger.info(f"    - Деактивовано оголошення: {', '.join(deactivated)}.")
+
+            # Нове покоління даних робить закешовані звіти застарілими
+            await bump_data_generation(session)
+            await session.commit()
+        stats.update(new=len(new_ads), updated=len(rows) - len(new_ads), deactivated=len(deactivated))
+        for change in ('new', 'updated', 'deactivated'):
+            ADS_TOTAL.inc(stats[change], business=business.name, change=change)
+        logger.info(f"  -> Зміни для бізнесу '{business.name}' збережено: "
+                    f"нових {stats['new']}, оновлено {stats['updated']}, деактивовано {stats['deactivated']}.")
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         logger.error(f"  -> КРИТИЧНА ПОМИЛКА обробки '{business.name}': {e}. Зміни відкочено.")
+        # Задача має закритися як невдала, а не як скрапінг без змін
+        raise
     finally:
-        session.close()
+        await session.close()
+    return stats
 
 
-async def scrape_all():
-    """Головна функція, яка запускає скрапінг для всіх бізнесів з бази даних."""
+async def fetch_ads_for_business(page, business: Business):
+    """
+    Витягує рекламні оголошення для конкретного бізнесу, реалізуючи всю фінальну логіку.
+    Повертає статистику (нові/оновлені/деактивовані, прокручування) або None, якщо сторінку не вдалося обробити.
+    """
+    with business_scope(business.name):
+        loaded = await load_ads_from_page(page, business)
+        if loaded is None:
+            return None
+        ads, page_stats = loaded
 
-    # Перевіряємо, чи не йде вже скрапінг
-    if shared_state.is_scraping:
-        logger.info("🟡 Спроба запуску скрапінгу, але попередній процес ще активний. Пропускаємо.")
-        return
+        logger.info(f"  -> Знайдено {len(ads)} унікальних оголошень для '{business.name}' (джерело: {page_stats['source']}).")
+        stats = {'new': 0, 'updated': 0, 'deactivated': 0, **page_stats}
+        if not ads:
+            return stats
 
-    # Встановлюємо "замок"
-    shared_state.is_scraping = True
-    logger.info("--- Процес скрапінгу розпочато, встановлено замок. ---")
+        return await save_ads(business, ads, stats)
 
-    try:
-        session = Session()
-        businesses = session.query(Business).all()
-        session.close()
-
-        if not businesses:
-            logger.info("У базі даних немає бізнесів для скрапінгу.")
-            return
-
-        async with async_playwright() as p:
-            browser = None
-            try:
-                browser = await p.chromium.launch(headless=True)
-                context = await browser.new_context(
-                    locale='uk-UA',
-                    user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/115.0"
-                )
-                page = await context.new_page()
-
-                for business in businesses:
-                    logger.info(f"Починаю скрапінг для бізнесу: '{business.name}'")
-                    await fetch_ads_for_business(page, business)
-                    logger.info(f"Закінчено скрапінг для бізнесу: '{business.name}'\n")
-
-            except Exception as e:
-                logger.error(f"Критична помилка під час роботи браузера: {e}")
-            finally:
-                if browser:
-                    await browser.close()
-                    logger.info("Браузер Playwright закрито.")
-    finally:
-        # Щоб замок точно знявся
-        shared_state.is_scraping = False
-        logger.info("--- Процес скрапінгу завершено, замок знято. ---")
 
-# тестовий скрапінг
+# тестовий скрапінг: ставить усі бізнеси в чергу задач і обробляє її, доки вона не спорожніє
 if __name__ == '__main__':
-    asyncio.run(scrape_all())
\ No newline at end of file
+    from scheduler.jobs import enqueue_businesses
+    from scheduler.worker import run_worker
+
+    async def scrape_all():
+        async with AsyncSession() as session:
+            business_ids = (await session.execute(select(Business.id))).scalars().all()
+        enqueued, skipped = await enqueue_businesses(business_ids)
+        logger.info(f"Поставлено в чергу: {enqueued}, вже активних задач: {skipped}.")
+        await run_worker(drain=True)
+
+    asyncio.run(scrape_all())
@@ -0,0 +1,53 @@
+import numpy as np
+
+# по тестам 14 найкраще відсіює схожі
+HAMMING_DISTANCE_THRESHOLD = 14
+
+
+def hash_to_int(hex_hash: str) -> int:
+    """Перетворює hex-рядок pHash (як його зберігає imagehash) на 64-бітне ціле."""
+    return int(hex_hash, 16)
+
+
+def hash_to_signed(hex_hash: str) -> int:
+    """pHash як знакове 64-бітне ціле для колонки BIGINT (той самий набір бітів, доповнювальний код)."""
+    value = int(hex_hash, 16)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def signed_to_int(value: int) -> int:
+    """Зворотне до hash_to_signed: значення з BIGINT -> беззнакові 64 біти для HashIndex."""
+    return value & ((1 << 64) - 1)
+
+
+class HashIndex:
+    """
+    Упакований масив uint64 з хешами представників груп.
+    Пошук найближчого представника — один векторизований XOR + popcount по всьому масиву.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._hashes = np.empty(capacity, dtype=np.uint64)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, value: int) -> int:
+        """Додає хеш і повертає його позицію в індексі."""
+        if self._size == len(self._hashes):
+            self._hashes = np.resize(self._hashes, len(self._hashes) * 2)
+        self._hashes[self._size] = np.uint64(value)
+        self._size += 1
+        return self._size - 1
+
+    def distances(self, value: int) -> np.ndarray:
+        return np.bitwise_count(self._hashes[:self._size] ^ np.uint64(value))
+
+    def first_within(self, value: int, threshold: int = HAMMING_DISTANCE_THRESHOLD) -> int | None:
+        """Позиція першого доданого хешу на відстані не більше `threshold`, або None."""
+        if not self._size:
+            return None
+        matches = np.flatnonzero(self.distances(value) <= threshold)
+        return int(matches[0]) if len(matches) else None
+
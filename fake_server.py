@@ -1,14 +1,27 @@
 from aiohttp import web
 
+import metrics
+
 async def handle(request):
     return web.Response(text="Bot is running")
 
-async def start_fake_server():
-    app = web.Application()
-    app.router.add_get("/", handle)
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def _serve(app, port):
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", 10000)
+    site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
 
+async def start_fake_server():
+    app = web.Application()
+    app.router.add_get("/", handle)
+    app.router.add_get("/metrics", handle_metrics)
+    await _serve(app, 10000)
 
+async def start_metrics_server(port):
+    """Лише /metrics — для окремого процесу воркера, у якого немає власного веб-сервера."""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    await _serve(app, port)
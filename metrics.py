@@ -0,0 +1,121 @@
+"""
+Легка внутрішньопроцесна інструментація: лічильники й гістограми у форматі Prometheus.
+Бізнес, для якого виконується код, береться з contextvar, тож глибокі модулі
+(завантаження, хешування) не мусять протягувати його через аргументи.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+current_business: ContextVar[str] = ContextVar('current_business', default='-')
+
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: tuple = ()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for key, value in sorted(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [лічильники по кошиках..., count, sum]
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 2)
+        # Кошики зберігаються некумулятивно, сума рахується при рендері
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, (('le', bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+        return lines
+
+
+def render() -> str:
+    return '\n'.join(line for metric in _registry for line in metric.render()) + '\n'
+
+
+PHASE_SECONDS = Histogram(
+    'adbot_phase_seconds', 'Тривалість фаз скрапінгу та надсилання', ('phase', 'business'))
+ADS_TOTAL = Counter('adbot_ads_total', 'Оголошення за типом зміни', ('business', 'change'))
+DOWNLOADED_BYTES = Counter('adbot_downloaded_bytes_total', 'Завантажені байти креативів', ('business',))
+ROUTED_REQUESTS = Counter(
+    'adbot_routed_requests_total', 'Запити контекстів браузера за типом ресурсу і рішенням', ('resource_type', 'action'))
+ROUTED_BYTES = Counter(
+    'adbot_routed_bytes_total', 'Байти дозволених відповідей і оцінка зекономлених на заблокованих запитах',
+    ('resource_type', 'action'))
+SCRAPE_CONTENTION = Counter(
+    'adbot_scrape_lock_contention_total', 'Запити на скрапінг, відхилені через уже активну задачу', ('source',))
+
+
+@contextmanager
+def business_scope(name: str):
+    """Позначає весь код усередині (разом із дочірніми задачами asyncio) як роботу для бізнесу `name`."""
+    token = current_business.set(name)
+    try:
+        yield
+    finally:
+        current_business.reset(token)
+
+
+@contextmanager
+def phase(name: str):
+    """Вимірює фазу для поточного бізнесу."""
+    with PHASE_SECONDS.time(phase=name, business=current_business.get()):
+        yield
@@ -9,29 +9,38 @@ import asyncio
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.memory import MemoryStorage
 from cleanup_service import run_clean_up
-import shared_state
 from bot.handlers import router
-from config import BOT_TOKEN
-from database.models import Base, engine
+from bot.progress import resume_tracking
+from config import BOT_TOKEN, RUN_EMBEDDED_WORKER
+from database.migrations import run_migrations
+from facebook.browser import browser_manager
 from scheduler.updater import start as start_scheduler
+from scheduler.worker import run_worker
 
 
 async def main():
-    shared_state.is_scraping = False
-    logger.info("ℹ️ Статус скрапінгу скинуто на 'вільно'.")
-    logger.info("Ensuring database tables exist...")
-    Base.metadata.create_all(engine)
-    logger.info("Database tables checked/created.")
+    logger.info("Applying database migrations...")
+    run_migrations()
 
     bot = Bot(token=BOT_TOKEN)
     dp = Dispatcher(storage=MemoryStorage())
     dp.include_router(router)
+    await resume_tracking(bot)
     start_scheduler()
     logger.info('✅ Бот запущено, очікую повідомлення...')
 
+    # Незавершені задачі попереднього запуску повернуться в роботу, коли спливе їхня оренда
+    if RUN_EMBEDDED_WORKER:
+        # Браузер стартує один раз і обслуговує всі задачі воркера в процесі бота
+        await browser_manager.start()
+        asyncio.create_task(run_worker())
+
     asyncio.create_task(run_clean_up())
     await start_fake_server()
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await browser_manager.stop()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
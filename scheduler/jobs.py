@@ -0,0 +1,199 @@
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload
+
+from config import JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS
+from database.models import AsyncSession, ScrapeJob, ScrapeRun
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+async def _insert_jobs(session, business_ids: set, run_id: int | None) -> int:
+    # Унікальний частковий індекс відсікає бізнеси з активною задачею без гонок між процесами
+    result = await session.execute(
+        insert(ScrapeJob)
+        .values([{'business_id': business_id, 'run_id': run_id, 'status': 'pending', 'attempts': 0,
+                  'enqueued_at': datetime.utcnow()} for business_id in business_ids])
+        .on_conflict_do_nothing(index_elements=[ScrapeJob.business_id],
+                                index_where=ScrapeJob.status.in_(ACTIVE_STATUSES))
+        .returning(ScrapeJob.id)
+    )
+    return len(result.all())
+
+
+async def enqueue_businesses(business_ids) -> tuple[int, int]:
+    """
+    Ставить у чергу задачі для бізнесів, у яких ще немає активної задачі.
+    Повертає (поставлено, пропущено як уже активні).
+    """
+    business_ids = set(business_ids)
+    if not business_ids:
+        return 0, 0
+    async with AsyncSession() as session:
+        enqueued = await _insert_jobs(session, business_ids, None)
+        await session.commit()
+    return enqueued, len(business_ids) - enqueued
+
+
+async def start_run(business_ids, chat_id: int) -> tuple[int | None, int, int]:
+    """
+    Ручний запуск: ставить задачі, прив'язані до нового запуску, щоб відстежувати його прогрес.
+    Запуск створюється в тій самій транзакції і лише якщо поставлено хоча б одну задачу.
+    Повертає (номер запуску або None, поставлено, пропущено як уже активні).
+    """
+    business_ids = set(business_ids)
+    if not business_ids:
+        return None, 0, 0
+    async with AsyncSession() as session:
+        run = ScrapeRun(chat_id=chat_id)
+        session.add(run)
+        await session.flush()
+        enqueued = await _insert_jobs(session, business_ids, run.id)
+        if not enqueued:
+            await session.rollback()
+            return None, 0, len(business_ids)
+        await session.commit()
+        return run.id, enqueued, len(business_ids) - enqueued
+
+
+def _claimable(now: datetime):
+    """Нові задачі та задачі, чий воркер перестав продовжувати оренду."""
+    return or_(
+        ScrapeJob.status == 'pending',
+        and_(ScrapeJob.status == 'running', ScrapeJob.lease_expires_at < now),
+    )
+
+
+async def claim_job(worker_id: str) -> ScrapeJob | None:
+    """
+    Забирає одну задачу через SELECT ... FOR UPDATE SKIP LOCKED, тож кілька воркерів
+    (у різних процесах чи контейнерах) ніколи не отримають ту саму задачу.
+    """
+    now = datetime.utcnow()
+    async with AsyncSession() as session:
+        # Задачі, що вичерпали спроби (воркер падав на них щоразу), закриваються як невдалі
+        await session.execute(
+            update(ScrapeJob)
+            .where(_claimable(now), ScrapeJob.attempts >= JOB_MAX_ATTEMPTS)
+            .values(status='failed', finished_at=now, error='Перевищено кількість спроб')
+        )
+        job = await session.scalar(
+            select(ScrapeJob)
+            .where(_claimable(now))
+            .order_by(ScrapeJob.enqueued_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if job is None:
+            await session.commit()
+            return None
+
+        if job.status == 'running':
+            logger.warning(f"Оренда задачі {job.id} воркера {job.lease_owner} прострочена, забираю її.")
+        job.status = 'running'
+        job.lease_owner = worker_id
+        job.lease_expires_at = now + timedelta(seconds=JOB_LEASE_SECONDS)
+        job.started_at = now
+        job.attempts = (job.attempts or 0) + 1
+        await session.commit()
+        return job
+
+
+async def heartbeat(job_id: int, worker_id: str) -> bool:
+    """Продовжує оренду; False, якщо задачу вже забрав інший воркер."""
+    async with AsyncSession() as session:
+        result = await session.execute(
+            update(ScrapeJob)
+            .where(ScrapeJob.id == job_id, ScrapeJob.lease_owner == worker_id, ScrapeJob.status == 'running')
+            .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def finish_job(job_id: int, worker_id: str, stats: dict | None, error: str | None = None):
+    values = {'finished_at': datetime.utcnow(), 'lease_expires_at': None}
+    if stats is None:
+        values.update(status='failed', error=error or 'Сторінку не вдалося обробити')
+    else:
+        values.update(status='done', new_ads=stats.get('new', 0), updated_ads=stats.get('updated', 0),
+                      deactivated_ads=stats.get('deactivated', 0))
+    async with AsyncSession() as session:
+        await session.execute(
+            update(ScrapeJob).where(ScrapeJob.id == job_id, ScrapeJob.lease_owner == worker_id).values(**values)
+        )
+        await session.commit()
+
+
+async def set_run_message(run_id: int, message_id: int):
+    async with AsyncSession() as session:
+        await session.execute(update(ScrapeRun).where(ScrapeRun.id == run_id).values(message_id=message_id))
+        await session.commit()
+
+
+async def run_progress(run_id: int) -> dict | None:
+    """
+    Зведення по запуску: кількість задач за статусами, сумарні лічильники оголошень
+    і назви бізнесів, що зараз в роботі. Коли всі задачі закрито, запуск позначається завершеним.
+    """
+    async with AsyncSession() as session:
+        run = await session.get(ScrapeRun, run_id)
+        if run is None:
+            return None
+        jobs = (await session.execute(
+            select(ScrapeJob).where(ScrapeJob.run_id == run_id).options(joinedload(ScrapeJob.business))
+        )).scalars().all()
+
+        counts = {status: 0 for status in ('pending', 'running', 'done', 'failed')}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        finished = counts['pending'] == 0 and counts['running'] == 0
+        if finished and run.finished_at is None:
+            run.finished_at = max((job.finished_at for job in jobs if job.finished_at), default=datetime.utcnow())
+            await session.commit()
+
+        return {
+            'run_id': run.id,
+            'chat_id': run.chat_id,
+            'message_id': run.message_id,
+            'total': len(jobs),
+            'counts': counts,
+            'new': sum(job.new_ads or 0 for job in jobs),
+            'updated': sum(job.updated_ads or 0 for job in jobs),
+            'deactivated': sum(job.deactivated_ads or 0 for job in jobs),
+            'running_names': [job.business.name for job in jobs if job.status == 'running' and job.business],
+            'failed_names': [job.business.name for job in jobs if job.status == 'failed' and job.business],
+            'elapsed': ((run.finished_at or datetime.utcnow()) - run.created_at).total_seconds(),
+            'finished': finished,
+        }
+
+
+async def unfinished_run_ids() -> list[int]:
+    async with AsyncSession() as session:
+        return list((await session.execute(
+            select(ScrapeRun.id).where(ScrapeRun.finished_at.is_(None), ScrapeRun.message_id.is_not(None))
+        )).scalars())
+
+
+async def queue_overview(recent: int = 5) -> dict:
+    """Стан черги для /scrape_status: активні задачі та останні завершені."""
+    async with AsyncSession() as session:
+        active = (await session.execute(
+            select(ScrapeJob).where(ScrapeJob.status.in_(ACTIVE_STATUSES))
+            .options(joinedload(ScrapeJob.business)).order_by(ScrapeJob.enqueued_at)
+        )).scalars().all()
+        finished = (await session.execute(
+            select(ScrapeJob).where(ScrapeJob.status.in_(('done', 'failed')))
+            .options(joinedload(ScrapeJob.business)).order_by(ScrapeJob.finished_at.desc()).limit(recent)
+        )).scalars().all()
+        runs = (await session.execute(
+            select(ScrapeRun.id)
+            .where(ScrapeRun.finished_at.is_(None), ScrapeRun.message_id.is_not(None))
+            .order_by(ScrapeRun.id)
+        )).scalars().all()
+    return {'active': active, 'recent': finished, 'open_runs': list(runs)}
@@ -0,0 +1,55 @@
+import logging
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from config import (SCHEDULE_MIN_INTERVAL, SCHEDULE_MAX_INTERVAL, SCHEDULE_DEFAULT_INTERVAL, SCHEDULE_JITTER)
+from database.models import AsyncSession, Business
+
+logger = logging.getLogger(__name__)
+
+# Наскільки швидко інтервал реагує на зміни: при змінах — удвічі частіше, без змін — у 1.5 раза рідше
+SPEED_UP_FACTOR = 0.5
+SLOW_DOWN_FACTOR = 1.5
+
+
+def next_interval(current: int | None, churn: int | None) -> int:
+    """
+    Новий інтервал у хвилинах: бізнеси, де з'являються чи зникають оголошення,
+    скрапляться частіше, а незмінні — рідше, в межах [SCHEDULE_MIN_INTERVAL, SCHEDULE_MAX_INTERVAL].
+    Невдалий скрапінг (churn is None) повторюється через мінімальний інтервал, не змінюючи поточного.
+    """
+    current = current or SCHEDULE_DEFAULT_INTERVAL
+    if churn is None:
+        return current
+    factor = SPEED_UP_FACTOR if churn > 0 else SLOW_DOWN_FACTOR
+    return int(min(SCHEDULE_MAX_INTERVAL, max(SCHEDULE_MIN_INTERVAL, current * factor)))
+
+
+def jittered(minutes: float) -> timedelta:
+    """Розкидає старти на ±SCHEDULE_JITTER, щоб бізнеси не синхронізувалися між собою."""
+    return timedelta(minutes=minutes * random.uniform(1 - SCHEDULE_JITTER, 1 + SCHEDULE_JITTER))
+
+
+def initial_due_time(now: datetime) -> datetime:
+    """Для бізнесів без розкладу — випадковий момент у межах мінімального інтервалу, а не всі одразу."""
+    return now + timedelta(minutes=random.uniform(0, SCHEDULE_MIN_INTERVAL))
+
+
+async def record_scrape_result(business: Business, stats: dict | None):
+    """Зберігає результат скрапінгу і наступний час запуску бізнесу."""
+    now = datetime.utcnow()
+    churn = None if stats is None else stats.get('new', 0) + stats.get('deactivated', 0)
+    interval = next_interval(business.scrape_interval_minutes, churn)
+    delay = SCHEDULE_MIN_INTERVAL if churn is None else interval
+
+    values = {'scrape_interval_minutes': interval, 'next_scrape_at': now + jittered(delay)}
+    if churn is not None:
+        values.update(last_scraped_at=now, last_churn=churn)
+
+    async with AsyncSession() as session:
+        await session.execute(update(Business).where(Business.id == business.id).values(**values))
+        await session.commit()
+    logger.info(f"  -> Розклад '{business.name}': змін {churn}, інтервал {interval} хв, "
+                f"наступний запуск {values['next_scrape_at']:%H:%M} UTC.")
@@ -1,8 +1,51 @@
+import logging
+from datetime import datetime
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from facebook.scraper import scrape_all
+from sqlalchemy import select, update
+
+from config import SCHEDULER_TICK_SECONDS
+from database.models import AsyncSession, Business
+from metrics import SCRAPE_CONTENTION
+from scheduler.jobs import enqueue_businesses
+from scheduler.policy import initial_due_time
+
+logger = logging.getLogger(__name__)
+
+
+async def run_due_scrapes():
+    """
+    Тік планувальника: ставить у чергу задачі для бізнесів, у яких настав next_scrape_at.
+    Самі задачі виконують воркери (див. scheduler/worker.py), бізнеси з активною задачею пропускаються.
+    Бізнеси без розкладу отримують випадковий час старту, тож після рестарту
+    чи додавання багатьох бізнесів вони не запускаються всі одночасно.
+    """
+    now = datetime.utcnow()
+    async with AsyncSession() as session:
+        unscheduled = (await session.execute(
+            select(Business.id).where(Business.next_scrape_at.is_(None))
+        )).scalars().all()
+        if unscheduled:
+            await session.execute(update(Business), [
+                {'id': business_id, 'next_scrape_at': initial_due_time(now)} for business_id in unscheduled
+            ])
+            await session.commit()
+            logger.info(f"Заплановано перший скрапінг для {len(unscheduled)} бізнесів.")
+
+        due = (await session.execute(
+            select(Business.id).where(Business.next_scrape_at <= now)
+        )).scalars().all()
+
+    if due:
+        enqueued, skipped = await enqueue_businesses(due)
+        if skipped:
+            SCRAPE_CONTENTION.inc(skipped, source='scheduler')
+        if enqueued:
+            logger.info(f"⏰ Поставлено в чергу {enqueued} бізнесів (вже в роботі: {skipped}).")
+
 
 def start():
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(scrape_all, 'interval', hours=1)
+    scheduler.add_job(run_due_scrapes, 'interval', seconds=SCHEDULER_TICK_SECONDS, max_instances=1, coalesce=True)
     print("Запущено автоматичний скрапінг")
-    scheduler.start()
\ No newline at end of file
+    scheduler.start()
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from config import SCRAPE_CONCURRENCY, JOB_HEARTBEAT_SECONDS, WORKER_POLL_SECONDS
+from database.models import AsyncSession, Business
+from facebook.browser import browser_manager
+from facebook.downloader import close_downloader
+from facebook.scraper import fetch_ads_for_business
+from metrics import PHASE_SECONDS
+from scheduler.jobs import claim_job, heartbeat, finish_job
+from scheduler.policy import record_scrape_result
+
+logger = logging.getLogger(__name__)
+
+
+async def _heartbeat_loop(job_id: int, owner: str):
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            if not await heartbeat(job_id, owner):
+                logger.warning(f"Оренду задачі {job_id} втрачено, результат не буде записано цим воркером.")
+                return
+        except Exception as e:
+            logger.error(f"Помилка heartbeat задачі {job_id}: {e}")
+
+
+async def process_job(job, owner: str, timings: dict):
+    """Скрапить бізнес задачі, оновлює його розклад і закриває задачу; тривалість записує в `timings`."""
+    async with AsyncSession() as session:
+        business = await session.get(Business, job.business_id)
+    if business is None:
+        await finish_job(job.id, owner, None, 'Бізнес видалено')
+        return
+
+    logger.info(f"[{owner}] Задача {job.id}: починаю скрапінг '{business.name}' (спроба {job.attempts})")
+    started = time.perf_counter()
+    stats, error = None, None
+    heartbeat_task = asyncio.create_task(_heartbeat_loop(job.id, owner))
+    try:
+        async with browser_manager.page() as page:
+            stats = await fetch_ads_for_business(page, business)
+    except Exception as e:
+        error = str(e)
+        logger.error(f"[{owner}] Помилка скрапінгу '{business.name}': {e}")
+    finally:
+        heartbeat_task.cancel()
+        timings[business.name] = time.perf_counter() - started
+        PHASE_SECONDS.observe(timings[business.name], phase='scrape_job', business=business.name)
+
+    try:
+        await record_scrape_result(business, stats)
+    except Exception as e:
+        logger.error(f"[{owner}] Не вдалося оновити розклад '{business.name}': {e}")
+    finally:
+        # Задача закривається навіть без оновленого розкладу, інакше її повторно забрали б після оренди
+        await finish_job(job.id, owner, stats, error)
+    logger.info(f"[{owner}] Задача {job.id} завершена за {timings[business.name]:.1f} с.")
+
+
+async def _worker_slot(owner: str, stop: asyncio.Event, drain: bool, timings: dict):
+    while not stop.is_set():
+        try:
+            job = await claim_job(owner)
+        except Exception as e:
+            logger.error(f"[{owner}] Не вдалося отримати задачу: {e}")
+            job = None
+
+        if job is None:
+            if drain:
+                return
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=WORKER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        try:
+            await process_job(job, owner, timings)
+        except Exception as e:
+            logger.error(f"[{owner}] Задача {job.id} аварійно завершилась: {e}")
+
+
+async def run_worker(concurrency: int = SCRAPE_CONCURRENCY, stop: asyncio.Event | None = None, drain: bool = False):
+    """
+    Воркер черги: `concurrency` слотів на одному браузері забирають задачі з бази.
+    Таких воркерів можна запускати скільки завгодно — у процесі бота чи окремо через worker.py.
+    З `drain` воркер завершується, щойно в черзі не лишається задач.
+    """
+    stop = stop or asyncio.Event()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    owns_browser = not browser_manager.started
+    if owns_browser:
+        await browser_manager.start()
+    logger.info(f"👷 Воркер {worker_id} запущено зі слотами: {concurrency}.")
+    run_started = time.perf_counter()
+    timings = {}
+    browser_manager.routing.reset()
+    try:
+        await asyncio.gather(*(_worker_slot(f"{worker_id}/{slot}", stop, drain, timings)
+                               for slot in range(1, concurrency + 1)))
+    finally:
+        await close_downloader()
+        if owns_browser:
+            await browser_manager.stop()
+        _log_run_summary(worker_id, time.perf_counter() - run_started, timings)
+
+
+def _log_run_summary(worker_id: str, total: float, timings: dict):
+    """Підсумок прогону воркера: час кожного бізнесу (найдовші першими), загальний час і маршрутизація запитів."""
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        logger.info(f"  ⏱ '{name}': {seconds:.1f} с")
+    logger.info(f"--- Воркер {worker_id} завершив роботу за {total:.1f} с ({len(timings)} бізнесів). ---")
+    browser_manager.routing.log_summary()
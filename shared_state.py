@@ -1 +0,0 @@
-is_scraping = False
\ No newline at end of file
@@ -0,0 +1,22 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# config читає базу під час імпорту; рушії SQLAlchemy лінуються і підключаються лише в тестах,
+# яким потрібна база — до окремої тестової з TEST_DATABASE_URL, а не до робочої
+if os.environ.get('TEST_DATABASE_URL'):
+    os.environ['POSTGRESQl_LINK'] = os.environ['TEST_DATABASE_URL']
+os.environ.setdefault('POSTGRESQl_LINK', 'postgresql://test@localhost/test')
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+FIXTURES = Path(__file__).resolve().parent / 'fixtures'
+
+
+@pytest.fixture
+def fixture_text():
+    """Записане тіло відповіді з tests/fixtures."""
+    def read(name: str) -> str:
+        return (FIXTURES / name).read_text(encoding='utf-8')
+    return read
@@ -0,0 +1,128 @@
+import json
+from datetime import date
+
+from facebook.network_capture import AdResponseCollector, XSSI_PREFIX, ad_record_from_json, iter_json_payloads
+
+
+class FakePage:
+    """Сторінка Playwright, якій колектор лише підписується на події."""
+
+    def on(self, event, handler):
+        pass
+
+    def remove_listener(self, event, handler):
+        pass
+
+
+def collect(*bodies: str) -> AdResponseCollector:
+    collector = AdResponseCollector(FakePage())
+    for body in bodies:
+        collector.feed(body)
+    return collector
+
+
+def test_graphql_response_records(fixture_text):
+    collector = collect(fixture_text('graphql_search_results.json'))
+
+    assert collector.responses_parsed == 1
+    assert collector.ads == {
+        '1200000000000001': {
+            'ad_id': '1200000000000001',
+            'start_date': date(2025, 5, 1),
+            'img_url': 'https://scontent.xx.fbcdn.net/v/t39.35426-6/creative_1.jpg',
+            'similar_count': 3,
+        },
+        # Карусель: перша картка без оригіналу, тож береться її зменшена копія
+        '1200000000000002': {
+            'ad_id': '1200000000000002',
+            'start_date': date(2025, 5, 2),
+            'img_url': 'https://scontent.xx.fbcdn.net/v/t39.35426-6/card_1_600.jpg',
+            'similar_count': 0,
+        },
+        # Відео: креатив — прев'ю
+        '1200000000000003': {
+            'ad_id': '1200000000000003',
+            'start_date': date(2025, 1, 1),
+            'img_url': 'https://scontent.xx.fbcdn.net/v/t39.35426-6/preview_3.jpg',
+            'similar_count': 0,
+        },
+        # Без start_date і зображень запис лишається, але з порожніми полями
+        '1200000000000004': {
+            'ad_id': '1200000000000004',
+            'start_date': None,
+            'img_url': None,
+            'similar_count': 2,
+        },
+    }
+
+
+def test_xssi_prefix_and_line_delimited_payloads(fixture_text):
+    graphql = json.dumps(json.loads(fixture_text('graphql_search_results.json')))
+    document = json.dumps(json.loads(fixture_text('document_embedded.json')))
+    body = f'{XSSI_PREFIX}{graphql}\n{{"label": "deferred"}}\n{document}\n'
+
+    assert len(list(iter_json_payloads(body))) == 3
+    assert set(collect(body).ads) == {f'120000000000000{n}' for n in range(1, 5)} | {'1200000000000010'}
+
+
+def test_repeated_ads_keep_first_record(fixture_text):
+    collector = collect(fixture_text('graphql_search_results.json'), fixture_text('document_embedded.json'))
+
+    assert collector.responses_parsed == 2
+    assert len(collector.ads) == 5
+    assert collector.ads['1200000000000010']['similar_count'] == 5
+
+
+def test_document_embedded_json(fixture_text):
+    document = fixture_text('document_embedded.json')
+    html = (
+        '<html><head>'
+        '<script type="application/json" data-content-len="120" data-sjs>{"require": [["Bootloader"]]}</script>'
+        f'<script type="application/json" data-content-len="{len(document)}" data-sjs>{document}</script>'
+        '</head><body></body></html>'
+    )
+    collector = AdResponseCollector(FakePage())
+    collector.feed_document(html)
+
+    # Скрипти без ad_archive_id не розбираються взагалі
+    assert collector.responses_parsed == 1
+    assert collector.ads['1200000000000010'] == {
+        'ad_id': '1200000000000010',
+        'start_date': date(2025, 6, 1),
+        'img_url': 'https://scontent.xx.fbcdn.net/v/t39.35426-6/creative_10.jpg',
+        'similar_count': 5,
+    }
+
+
+def test_node_without_snapshot_is_skipped():
+    assert ad_record_from_json({'ad_archive_id': '1', 'snapshot': None}) is None
+    assert ad_record_from_json({'snapshot': {'images': []}}) is None
+
+
+def test_garbage_body_is_ignored():
+    collector = collect('<!DOCTYPE html><html></html>', 'for (;;);{"error": 1357001}')
+
+    assert collector.ads == {}
+    assert not collector.covers(0)
+
+
+def test_html_fallback_when_network_misses_cards(fixture_text):
+    from facebook.scraper import extract_ads_from_html
+
+    collector = collect(fixture_text('graphql_search_results.json'))
+    html_records = extract_ads_from_html(fixture_text('ad_library_page.html'))
+
+    # На сторінці п'ять карток, а в JSON у п'ятої не було snapshot — мережевих даних недостатньо
+    assert len(html_records) == 5
+    assert not collector.covers(len(html_records))
+    assert collector.covers(len(html_records) - 1)
+
+    # HTML-парсер дає записи того самого формату й змісту, що й мережевий шлях
+    for ad_id, record in collector.ads.items():
+        assert html_records[ad_id] == record
+    assert html_records['1200000000000005'] == {
+        'ad_id': '1200000000000005',
+        'start_date': date(2025, 6, 15),
+        'img_url': 'https://scontent.xx.fbcdn.net/v/t39.35426-6/creative_5.jpg',
+        'similar_count': 0,
+    }
@@ -0,0 +1,112 @@
+"""
+Запити звітів і очищення мають користуватися індексами з міграції 3.
+
+Потрібна окрема тестова база PostgreSQL у TEST_DATABASE_URL, інакше тести пропускаються.
+Міграції застосовуються до неї, а синтетичні бізнеси й оголошення генеруються в транзакції,
+яку наприкінці відкочено, тож база лишається незмінною.
+"""
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+
+pytestmark = pytest.mark.skipif(not os.environ.get('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL не задано')
+
+# Таблиця має бути достатньо великою, щоб планувальник обирав індекс, а не послідовне читання
+SEED_BUSINESSES = 50
+SEED_ADS = 200_000
+
+SEED_SQL = """
+    INSERT INTO businesses (name, fb_page_id)
+    SELECT 'plan check ' || n, 'plan-check-' || n FROM generate_series(1, :businesses) AS n;
+    INSERT INTO creative_clusters (representative_hash) SELECT md5(n::text) FROM generate_series(1, :ads / 5) AS n;
+    INSERT INTO ad_creatives (fb_ad_id, business_id, local_path, cluster_id, start_date, last_seen, is_active)
+    SELECT 'plan-check-' || n,
+           (SELECT min(id) FROM businesses WHERE fb_page_id LIKE 'plan-check-%') + n % :businesses,
+           'images/plan-check.jpg',
+           (SELECT min(id) FROM creative_clusters) + n % (:ads / 5),
+           CASE WHEN n % 50 <> 0 THEN current_date - (n % 365) END,
+           current_date - (n % 35),
+           n % 10 <> 0
+    FROM generate_series(1, :ads) AS n;
+    ANALYZE businesses;
+    ANALYZE creative_clusters;
+    ANALYZE ad_creatives;
+"""
+
+BY_BUSINESS = {'ix_ad_creatives_business_start'}
+ACTIVE_BY_BUSINESS = {'ix_ad_creatives_active_business_start'}
+ACTIVE_RANGE = {'ix_ad_creatives_active_start', 'ix_ad_creatives_active_business_start'}
+
+
+def index_names(plan: dict) -> set[str]:
+    names = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', []):
+        names |= index_names(child)
+    return names
+
+
+def queries(business_id: int) -> dict:
+    """Назва випадку -> (запит, індекси, з яких план має використати хоча б один)."""
+    from sqlalchemy import select
+
+    from bot.reports import unique_report_query, full_report_query
+    from config import CLEANUP_BATCH_SIZE, REPORT_PAGE_SIZE
+    from database.models import AdCreative
+
+    cutoff = date.today() - timedelta(days=30)
+    return {
+        'report_week_business': (unique_report_query('week', str(business_id))[0], ACTIVE_BY_BUSINESS),
+        'report_all_business': (unique_report_query('all', str(business_id))[0], BY_BUSINESS),
+        'report_today_all': (unique_report_query('today', 'all')[0], ACTIVE_RANGE),
+        'reportall_month_business': (full_report_query('month', str(business_id))[0], ACTIVE_BY_BUSINESS),
+        'reportall_all_business': (full_report_query('all', str(business_id))[0], BY_BUSINESS),
+        'reportall_page_after_cursor': (
+            full_report_query('all', 'all', (business_id - 1, date.today(), 0))[0].limit(REPORT_PAGE_SIZE + 1),
+            BY_BUSINESS),
+        'reportall_page_after_undated': (
+            full_report_query('all', 'all', (business_id - 1, None, 0))[0].limit(REPORT_PAGE_SIZE + 1),
+            BY_BUSINESS),
+        'retention_cleanup': (
+            select(AdCreative.id, AdCreative.image_digest, AdCreative.local_path)
+            .where(~AdCreative.is_active, AdCreative.last_seen < cutoff)
+            .order_by(AdCreative.last_seen, AdCreative.id).limit(CLEANUP_BATCH_SIZE),
+            {'ix_ad_creatives_inactive_last_seen'}),
+    }
+
+
+CASES = ['report_week_business', 'report_all_business', 'report_today_all', 'reportall_month_business',
+         'reportall_all_business', 'reportall_page_after_cursor', 'reportall_page_after_undated',
+         'retention_cleanup']
+
+
+@pytest.fixture(scope='module')
+def seeded():
+    """З'єднання з синтетичними даними і id останнього бізнесу; після тестів усе відкочується."""
+    from sqlalchemy import select, text
+
+    from database.migrations import run_migrations
+    from database.models import Business, engine
+
+    run_migrations()
+    with engine.connect() as conn:
+        conn.execute(text(SEED_SQL), {'businesses': SEED_BUSINESSES, 'ads': SEED_ADS})
+        business_id = conn.execute(select(Business.id).order_by(Business.id.desc()).limit(1)).scalar()
+        yield conn, business_id
+        conn.rollback()
+
+
+@pytest.mark.parametrize('case', CASES)
+def test_query_uses_index(seeded, case):
+    from sqlalchemy import text
+    from sqlalchemy.dialects import postgresql
+
+    conn, business_id = seeded
+    query, expected = queries(business_id)[case]
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+
+    used = index_names(plan)
+    assert used & expected, f"план використав {sorted(used) or 'жодного індексу'}, очікувався один з {sorted(expected)}"
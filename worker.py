@@ -0,0 +1,22 @@
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+import asyncio
+
+from config import WORKER_METRICS_PORT
+from database.migrations import run_migrations
+from fake_server import start_metrics_server
+from scheduler.worker import run_worker
+
+
+async def main():
+    logger.info("Запускаю окремий воркер скрапінгу...")
+    run_migrations()
+    if WORKER_METRICS_PORT:
+        await start_metrics_server(WORKER_METRICS_PORT)
+    await run_worker()
+
+if __name__ == '__main__':
+    asyncio.run(main())